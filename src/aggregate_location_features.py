@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import json
+import os
+import time
+
+METROS_POR_GRADO = 111_320
+
+
+def load_feature_store(features_dir="."):
+    """Carga X_features*.npy / y_labels*.csv (uno o varios workers) en un solo arreglo"""
+    features_dir = Path(features_dir)
+    feature_files = sorted(features_dir.glob("X_features*.npy"))
+
+    X_parts = []
+    df_parts = []
+    for feature_file in feature_files:
+        suffix = feature_file.stem[len("X_features") :]
+        X_parts.append(np.load(feature_file))
+        df_parts.append(pd.read_csv(features_dir / f"y_labels{suffix}.csv"))
+        print(f"   {feature_file.name}: {len(df_parts[-1])} filas")
+
+    if not X_parts:
+        raise FileNotFoundError(f"No hay X_features*.npy en {features_dir}")
+
+    return np.concatenate(X_parts), pd.concat(df_parts, ignore_index=True)
+
+
+def attach_coordinates(df, metadata_path):
+    """Completa lat/lon desde el metadata.json del descargador (una entrada por ubicación)"""
+    if "lat" in df and df["lat"].notna().all():
+        return df
+
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        registros = json.load(f)
+
+    # Con varias vistas por ubicación, cada archivo apunta al mismo registro
+    coords = {}
+    for registro in registros:
+        archivos = [v["filename"] for v in registro.get("vistas", [])]
+        archivos.append(registro["filename"])
+        for archivo in archivos:
+            coords[archivo] = (registro["lat"], registro["lon"], registro.get("pano_id"))
+
+    # image_path puede ser absoluto (carpetas) o la clave del shard (sin extensión)
+    def clave(path):
+        parts = Path(path).parts[-2:]
+        return Path(*parts).as_posix()
+
+    claves = df["image_path"].map(clave)
+    por_clave = {Path(k).with_suffix("").as_posix(): v for k, v in coords.items()}
+    encontrados = claves.map(lambda k: coords.get(k, por_clave.get(k)))
+
+    df = df.copy()
+    df["lat"] = [c[0] if c else np.nan for c in encontrados]
+    df["lon"] = [c[1] if c else np.nan for c in encontrados]
+    df["pano_id"] = [c[2] if c else None for c in encontrados]
+
+    print(f"   Coordenadas encontradas: {encontrados.notna().sum()}/{len(df)}")
+    return df
+
+
+def grid_cells(lat, lon, cell_meters):
+    """Índices de celda de una grilla de cell_meters metros (equirectangular local)"""
+    lat0 = np.nanmean(lat)
+    cell_lat = np.floor(lat * METROS_POR_GRADO / cell_meters)
+    cell_lon = np.floor(lon * METROS_POR_GRADO * np.cos(np.radians(lat0)) / cell_meters)
+    return cell_lat, cell_lon
+
+
+def segment_reduce(X, order, starts, counts, ufunc):
+    """Reduce segmentos contiguos de X[order] sin copiar X completo
+
+    np.ufunc.reduceat sobre el eje 0 es lento con filas anchas; aquí se avanza
+    por posición dentro del segmento, así cada paso es una operación vectorizada
+    sobre todos los segmentos que todavía tienen filas."""
+    acc = X[order[starts]].astype(np.float32, copy=True)
+    for j in range(1, counts.max()):
+        activos = np.flatnonzero(counts > j)
+        acc[activos] = ufunc(acc[activos], X[order[starts[activos] + j]])
+    return acc
+
+
+def aggregate_by_location(X, df, cell_meters=25.0, pooling="mean"):
+    """Agrupa embeddings por (categoría, celda) y reduce cada segmento de forma vectorizada"""
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    lon = df["lon"].to_numpy(dtype=np.float64)
+    labels = df["label"].to_numpy()
+
+    cell_lat, cell_lon = grid_cells(lat, lon, cell_meters)
+
+    # Filas sin coordenadas forman su propio grupo
+    sin_coords = np.isnan(cell_lat) | np.isnan(cell_lon)
+    filas = np.arange(len(df))
+    cell_lat = np.where(sin_coords, -1, cell_lat).astype(np.int64)
+    cell_lon = np.where(sin_coords, filas, cell_lon).astype(np.int64)
+
+    # Ordenar por clave y cortar en segmentos contiguos
+    order = np.lexsort((cell_lon, cell_lat, sin_coords, labels))
+    keys = np.stack(
+        [labels[order], sin_coords[order], cell_lat[order], cell_lon[order]], axis=1
+    )
+    cambio = np.any(keys[1:] != keys[:-1], axis=1)
+    starts = np.concatenate([[0], np.flatnonzero(cambio) + 1])
+    counts = np.diff(np.append(starts, len(order)))
+
+    pooled = []
+    if pooling in ("mean", "mean+max"):
+        pooled.append(segment_reduce(X, order, starts, counts, np.add) / counts[:, None])
+    if pooling in ("max", "mean+max"):
+        pooled.append(segment_reduce(X, order, starts, counts, np.maximum))
+    X_loc = np.concatenate(pooled, axis=1).astype(np.float32)
+
+    df_loc = pd.DataFrame(
+        {
+            "label": labels[order][starts],
+            "category": df["category"].to_numpy()[order][starts],
+            "lat": np.add.reduceat(np.nan_to_num(lat[order]), starts) / counts,
+            "lon": np.add.reduceat(np.nan_to_num(lon[order]), starts) / counts,
+            "n_images": counts,
+            "cell_lat": cell_lat[order][starts],
+            "cell_lon": cell_lon[order][starts],
+        }
+    )
+    df_loc.loc[sin_coords[order][starts], ["lat", "lon"]] = np.nan
+
+    return X_loc, df_loc
+
+
+# ============ EJECUTAR ============
+
+if __name__ == "__main__":
+    print(f"\n{'='*60}")
+    print("📍 AGREGACIÓN DE FEATURES POR UBICACIÓN")
+    print(f"{'='*60}\n")
+
+    features_dir = os.getenv("FEATURES_DIR", ".")
+    metadata_path = os.getenv("METADATA_PATH", "../final_images/metadata.json")
+    cell_meters = float(os.getenv("CELDA_METROS", "25"))
+    pooling = os.getenv("POOLING", "mean")
+
+    print("📂 Cargando features...")
+    X, df = load_feature_store(features_dir)
+
+    if "lat" not in df or df["lat"].isna().any():
+        print(f"🧭 Uniendo coordenadas desde {metadata_path}...")
+        df = attach_coordinates(df, metadata_path)
+
+    start_time = time.time()
+    X_loc, df_loc = aggregate_by_location(X, df, cell_meters, pooling)
+    total_time = time.time() - start_time
+
+    print("💾 Guardando archivos...")
+    np.save("X_locations.npy", X_loc)
+    df_loc.to_csv("y_locations.csv", index=False)
+
+    print(f"\n{'='*60}")
+    print("📊 ARCHIVOS GENERADOS:")
+    print(f"{'='*60}")
+    print(f"   ✓ X_locations.npy - Shape: {X_loc.shape} (desde {X.shape[0]} imágenes)")
+    print(f"   ✓ y_locations.csv - {len(df_loc)} ubicaciones")
+    print(f"   Celda: {cell_meters:.0f} m, pooling: {pooling}, {total_time:.2f}s")
+    print(f"   Imágenes por ubicación: {df_loc['n_images'].mean():.2f} en promedio")
+    print(f"\n📈 Distribución de categorías:")
+    print(df_loc["category"].value_counts().to_string())
+    print(f"{'='*60}\n")
@@ -0,0 +1,300 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.extract_images.distritos_nse import DISTRITOS_NSE
+from src.extract_images.nodos_red import crear_nodos
+
+NODOS_POR_RED = 400
+CAJA_POR_DEFECTO = (-12.10, -12.08, -77.05, -77.03)
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_mock(puerto, args):
+    comando = [
+        sys.executable,
+        "-m",
+        "src.extract_images.mock_street_view",
+        "--puerto", str(puerto),
+        "--cobertura", str(args.cobertura),
+        "--latencia-ms", str(args.latencia_ms),
+        "--tasa-error", str(args.tasa_error),
+        "--tasa-429", str(args.tasa_429),
+        "--bytes", str(args.bytes),
+    ]
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL)
+
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", puerto), timeout=0.1):
+                return proceso
+        except OSError:
+            time.sleep(0.1)
+
+    proceso.terminate()
+    raise RuntimeError("El mock de Street View no arrancó")
+
+
+def red_sintetica(bboxes, n_nodos):
+    lat = []
+    lon = []
+    for lat_min, lat_max, lon_min, lon_max in bboxes:
+        for _ in range(n_nodos):
+            lat.append(random.uniform(lat_min, lat_max))
+            lon.append(random.uniform(lon_min, lon_max))
+    return crear_nodos(lat, lon)
+
+
+def cajas_de_lugar(lugar):
+    zonas = DISTRITOS_NSE.get(lugar)
+    if not zonas:
+        return [CAJA_POR_DEFECTO]
+    return [bbox for bbox, _ in zonas]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def medir(nombre, funcion):
+    from src.extract_images import cliente_street_view
+
+    cliente_street_view._CLIENTES.clear()
+
+    # Tiempo hasta la primera imagen: mide cuánto tarda la generación de
+    # candidatos en dejar trabajar al pipeline.
+    primera_imagen = []
+    imagen_original = cliente_street_view.ClienteStreetView.imagen
+
+    def imagen(self, *args, **kwargs):
+        contenido = imagen_original(self, *args, **kwargs)
+        if not primera_imagen:
+            primera_imagen.append(time.monotonic())
+        return contenido
+
+    uso_inicio = resource.getrusage(resource.RUSAGE_SELF)
+    inicio = time.monotonic()
+
+    cliente_street_view.ClienteStreetView.imagen = imagen
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stats = funcion()
+    finally:
+        cliente_street_view.ClienteStreetView.imagen = imagen_original
+
+    transcurrido = time.monotonic() - inicio
+    uso_fin = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (uso_fin.ru_utime - uso_inicio.ru_utime) + (
+        uso_fin.ru_stime - uso_inicio.ru_stime
+    )
+
+    cliente = cliente_street_view.obtener_cliente(os.environ["STREET_VIEW_API_KEY"])
+    latencias_metadata = list(cliente.latencias["streetview/metadata"])
+    latencias_imagen = list(cliente.latencias["streetview"])
+
+    return {
+        "descargador": nombre,
+        "segundos": round(transcurrido, 2),
+        "primera_imagen_s": round(primera_imagen[0] - inicio, 2)
+        if primera_imagen
+        else None,
+        "puntos_por_segundo": round(len(latencias_metadata) / transcurrido, 1),
+        "imagenes_por_segundo": round(len(latencias_imagen) / transcurrido, 1),
+        "ubicaciones_por_segundo": round(
+            stats["total_descargadas"] / transcurrido, 1
+        ),
+        "llamadas_metadata": len(latencias_metadata),
+        "llamadas_imagen": len(latencias_imagen),
+        "p95_metadata_ms": round(percentil(latencias_metadata, 0.95) * 1000, 1),
+        "p95_imagen_ms": round(percentil(latencias_imagen, 0.95) * 1000, 1),
+        "cpu_segundos": round(cpu, 2),
+        "cpu_porcentaje": round(100 * cpu / transcurrido, 1),
+        "concurrencia_final": {
+            endpoint: c.limite for endpoint, c in cliente.controladores.items()
+        },
+        "total_descargadas": stats["total_descargadas"],
+    }
+
+
+def preparar_nse(directorio, args):
+    modulo = importlib.import_module("src.extract_images.descargar_imagenes_nse")
+
+    cajas = [bbox for zonas in DISTRITOS_NSE.values() for bbox, _ in zonas]
+    modulo._LIMA_NODOS["drive"] = red_sintetica(cajas, args.nodos)
+    modulo.IMAGENES_POR_DISTRITO = args.imagenes_nse
+    modulo.OUTPUT_DIR = str(directorio / "nse")
+    return modulo
+
+
+def preparar_clasificadas(directorio, args):
+    modulo = importlib.import_module(
+        "src.extract_images.descargar_imagenes_clasificadas"
+    )
+
+    modulo.descargar_red_vial = lambda lugar: red_sintetica(
+        cajas_de_lugar(lugar), args.nodos
+    )
+    modulo.IMAGENES_POR_DISTRITO = args.imagenes_clasificadas
+    modulo.OUTPUT_DIR = str(directorio / "clasificadas")
+    return modulo
+
+
+def preparar_provincias(directorio, args):
+    modulo = importlib.import_module(
+        "src.extract_images.descargar_imagenes_provincias"
+    )
+
+    modulo.descargar_red_vial_urbanizacion = lambda bbox_o_distrito: red_sintetica(
+        [CAJA_POR_DEFECTO if isinstance(bbox_o_distrito, str) else bbox_o_distrito],
+        args.nodos,
+    )
+    modulo.IMAGENES_POR_URBANIZACION = args.imagenes_provincias
+    modulo.OUTPUT_DIR = str(directorio / "provincias")
+    return modulo
+
+
+def benchmark_nse(directorio, args):
+    modulo = preparar_nse(directorio, args)
+
+    def ejecutar():
+        base_path = modulo.crear_estructura_directorios()
+        return modulo.descargar_imagenes_dataset(None, base_path)
+
+    return medir("nse", ejecutar)
+
+
+def benchmark_clasificadas(directorio, args):
+    modulo = preparar_clasificadas(directorio, args)
+
+    def ejecutar():
+        base_path = modulo.crear_estructura_directorios()
+        return modulo.descargar_todas_categorias(base_path)
+
+    return medir("clasificadas", ejecutar)
+
+
+def benchmark_provincias(directorio, args):
+    modulo = preparar_provincias(directorio, args)
+
+    def ejecutar():
+        base_path = modulo.crear_estructura_directorios()
+        return modulo.descargar_todas_urbanizaciones(base_path)
+
+    return medir("provincias", ejecutar)
+
+
+def benchmark_conjunto(directorio, args):
+    # Las tres campañas a la vez sobre un solo núcleo compartido
+    from src.extract_images import nucleo_descarga
+
+    preparar_nse(directorio / "conjunto", args)
+    preparar_clasificadas(directorio / "conjunto", args)
+    preparar_provincias(directorio / "conjunto", args)
+    (directorio / "conjunto").mkdir(exist_ok=True)
+
+    def ejecutar():
+        resultados = nucleo_descarga.ejecutar_trabajos(
+            ["nse", "clasificadas", "provincias"],
+            api_key=os.environ["STREET_VIEW_API_KEY"],
+        )
+        return {
+            "total_descargadas": sum(
+                stats["total_descargadas"] for stats in resultados.values()
+            )
+        }
+
+    return medir("conjunto", ejecutar)
+
+
+BENCHMARKS = {
+    "nse": benchmark_nse,
+    "clasificadas": benchmark_clasificadas,
+    "provincias": benchmark_provincias,
+    "conjunto": benchmark_conjunto,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de los descargadores contra el mock local de Street View"
+    )
+    parser.add_argument(
+        "--descargadores", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--nodos", type=int, default=NODOS_POR_RED)
+    parser.add_argument("--imagenes-nse", type=int, default=40)
+    parser.add_argument("--imagenes-clasificadas", type=int, default=100)
+    parser.add_argument("--imagenes-provincias", type=int, default=10)
+    parser.add_argument("--cobertura", type=float, default=0.6)
+    parser.add_argument("--latencia-ms", type=float, default=80.0)
+    parser.add_argument("--tasa-error", type=float, default=0.01)
+    parser.add_argument("--tasa-429", type=float, default=0.02)
+    parser.add_argument("--bytes", type=int, default=45_000)
+    parser.add_argument("--qps", type=float, default=200.0)
+    parser.add_argument("--vistas", type=int, default=1)
+    parser.add_argument("--salida", type=str, default=None)
+    args = parser.parse_args()
+
+    puerto = puerto_libre()
+    directorio = Path(tempfile.mkdtemp(prefix="benchmark_sv_"))
+
+    # Debe configurarse antes de importar los descargadores: leen el entorno
+    # al cargarse.
+    os.environ["STREET_VIEW_BASE_URL"] = f"http://127.0.0.1:{puerto}"
+    os.environ["STREET_VIEW_API_KEY"] = "benchmark"
+    os.environ["STREET_VIEW_QPS"] = str(args.qps)
+    os.environ["VISTAS_POR_UBICACION"] = str(args.vistas)
+    os.environ["ARCHIVO_COBERTURA"] = str(directorio / "cobertura.json")
+    os.environ["ARCHIVO_CUOTA"] = str(directorio / "cuota.json")
+    # Sin registro: cada corrida debe pasar por la API para medir algo
+    os.environ["ARCHIVO_REGISTRO"] = ""
+
+    print(f"\n🧪 Benchmark de descargadores (mock en puerto {puerto})")
+    print(f"   Salida temporal: {directorio}\n")
+
+    mock = iniciar_mock(puerto, args)
+    resultados = []
+    try:
+        for nombre in args.descargadores:
+            print(f"   ⏱️  {nombre}...", end=" ", flush=True)
+            resultado = BENCHMARKS[nombre](directorio, args)
+            resultados.append(resultado)
+            print(
+                f"{resultado['puntos_por_segundo']} puntos/s, "
+                f"primera imagen {resultado['primera_imagen_s']} s, "
+                f"p95 metadata {resultado['p95_metadata_ms']} ms, "
+                f"p95 imagen {resultado['p95_imagen_ms']} ms, "
+                f"CPU {resultado['cpu_porcentaje']}%"
+            )
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print()
+    print(json.dumps(resultados, indent=2))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+import osmnx as ox
+from dotenv import load_dotenv
+
+from src.extract_images.nodos_red import (
+    DTYPE_NODOS,
+    DTYPE_SEGMENTOS,
+    candidatos,
+    nodos_de_grafo,
+    segmentos_de_grafo,
+)
+
+load_dotenv()
+
+DIRECTORIO_CACHE = os.getenv("CACHE_GRAFOS", "cache_grafos")
+TTL_DIAS = float(os.getenv("CACHE_GRAFOS_DIAS", "30"))
+REFRESCAR = os.getenv("CACHE_GRAFOS_REFRESCAR", "0") == "1"
+
+FORMATO = 3
+
+# Overpass corta con 429 si se le piden muchas redes a la vez
+CONCURRENCIA_OVERPASS = int(os.getenv("CONCURRENCIA_OVERPASS", "2"))
+
+_LOCK = threading.Lock()
+_EN_VUELO = {}
+_RESULTADOS = {}
+_OVERPASS = threading.BoundedSemaphore(CONCURRENCIA_OVERPASS)
+
+
+def archivo_cache(lugar, network_type, directorio=DIRECTORIO_CACHE):
+    # La versión de osmnx entra en la clave: cambia cómo se simplifica la red
+    # y con ella qué nodos existen.
+    if isinstance(lugar, str):
+        nombre = lugar.split(",")[0]
+    else:
+        nombre = "bbox"
+        lugar = [round(float(v), 6) for v in lugar]
+
+    clave = json.dumps(
+        [lugar, network_type, ox.__version__, FORMATO], ensure_ascii=False
+    )
+    resumen = hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12]
+    nombre = "".join(c if c.isalnum() else "_" for c in nombre)
+    return Path(directorio) / f"{network_type}_{nombre}_{resumen}.npz"
+
+
+def guardar_nodos(archivo, nodos, segmentos):
+    # Escritura atómica: otro proceso leyendo el mismo archivo nunca ve un
+    # npz a medio escribir.
+    archivo = Path(archivo)
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=archivo.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, nodos=nodos, segmentos=segmentos)
+        os.replace(tmp, archivo)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def cargar_nodos(archivo, ttl_dias=TTL_DIAS):
+    archivo = Path(archivo)
+    if REFRESCAR or not archivo.exists():
+        return None
+    if time.time() - archivo.stat().st_mtime > ttl_dias * 86400:
+        return None
+
+    try:
+        with np.load(archivo) as datos:
+            nodos = datos["nodos"]
+            segmentos = datos["segmentos"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"   ⚠️  Cache de red vial ilegible ({archivo.name}): {e}")
+        return None
+
+    if nodos.dtype != DTYPE_NODOS or segmentos.dtype != DTYPE_SEGMENTOS:
+        print(f"   ⚠️  Cache de red vial con otro formato ({archivo.name})")
+        return None
+    return nodos, segmentos
+
+
+def red_vial_cacheada(lugar, network_type, descargar, directorio=DIRECTORIO_CACHE):
+    # lugar: nombre ("Catacaos, Piura, Peru") o caja
+    # (lat_min, lat_max, lon_min, lon_max). Con ARCHIVO_PBF la red sale del
+    # extracto local y descargar no se llama.
+    from src.extract_images import extracto_osm
+
+    if extracto_osm.ARCHIVO_PBF:
+        return extracto_osm.red_vial_local(lugar, network_type)
+
+    # Devuelve solo los puntos candidatos (nodos o puntos sobre las aristas,
+    # ver nodos_red): el grafo de osmnx se libera apenas se extraen.
+    # Pedidos simultáneos de la misma red esperan a una sola descarga y el
+    # resultado queda en memoria para el resto del proceso.
+    archivo = archivo_cache(lugar, network_type, directorio)
+
+    with _LOCK:
+        if archivo in _RESULTADOS:
+            return _RESULTADOS[archivo]
+        futuro = _EN_VUELO.get(archivo)
+        propio = futuro is None
+        if propio:
+            futuro = _EN_VUELO[archivo] = Future()
+
+    if not propio:
+        return futuro.result()
+
+    nodos = None
+    try:
+        nodos = _cargar_o_descargar(archivo, network_type, descargar)
+    except Exception as e:
+        futuro.set_exception(e)
+        raise
+    else:
+        futuro.set_result(nodos)
+    finally:
+        with _LOCK:
+            del _EN_VUELO[archivo]
+            # Un fallo no se recuerda: el próximo pedido vuelve a intentar
+            if nodos is not None:
+                _RESULTADOS[archivo] = nodos
+    return nodos
+
+
+def _cargar_o_descargar(archivo, network_type, descargar):
+    red = cargar_nodos(archivo)
+    if red is not None:
+        print(f"   💾 Red vial desde cache ({network_type}): {len(red[0]):,} nodos")
+        return candidatos(*red)
+
+    with _OVERPASS:
+        graph = descargar()
+    if graph is None:
+        return None
+    nodos = nodos_de_grafo(graph)
+    segmentos = segmentos_de_grafo(graph)
+    del graph
+
+    try:
+        guardar_nodos(archivo, nodos, segmentos)
+    except OSError as e:
+        print(f"   ⚠️  No se pudo guardar la red vial en cache: {e}")
+    return candidatos(nodos, segmentos)
@@ -0,0 +1,338 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from src.extract_images.metricas import METRICAS
+
+load_dotenv()
+
+BASE_URL = os.getenv("STREET_VIEW_BASE_URL", "https://maps.googleapis.com/maps/api")
+
+QPS_MAXIMO = float(os.getenv("STREET_VIEW_QPS", "25"))
+
+CONCURRENCIA_INICIAL = 4
+CONCURRENCIA_MINIMA = 1
+CONCURRENCIA_MAXIMA = 32
+
+LATENCIA_OBJETIVO = 2.0
+VENTANA_RECORTE = 1.0
+
+MAX_REINTENTOS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAXIMO = 30.0
+
+TIMEOUT_METADATA = 10
+TIMEOUT_IMAGEN = 15
+
+MUESTRAS_LATENCIA = 100_000
+
+COSTO_POR_IMAGEN = 0.007
+
+ETAPAS = {"streetview/metadata": "metadata", "streetview": "imagen"}
+
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+ESTADOS_REINTENTABLES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+ESTADOS_SIN_COBERTURA = {"ZERO_RESULTS", "NOT_FOUND"}
+
+
+class ErrorStreetView(Exception):
+    def __init__(self, mensaje, reintentable, status_code=None):
+        super().__init__(mensaje)
+        self.reintentable = reintentable
+        self.status_code = status_code
+
+
+class LimitadorTasa:
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad if capacidad is not None else max(1.0, tasa))
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(
+                    self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa
+                )
+                self._ultimo = ahora
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                espera = (1 - self._tokens) / self.tasa
+
+            time.sleep(espera)
+
+
+class ControladorAIMD:
+    def __init__(
+        self,
+        inicial=CONCURRENCIA_INICIAL,
+        minimo=CONCURRENCIA_MINIMA,
+        maximo=CONCURRENCIA_MAXIMA,
+        latencia_objetivo=LATENCIA_OBJETIVO,
+    ):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.latencia_objetivo = latencia_objetivo
+        self.limite = float(inicial)
+        self.en_vuelo = 0
+        self._exitos = 0
+        self._ultimo_recorte = 0.0
+        self._cond = threading.Condition()
+
+    def acotar(self, maximo):
+        with self._cond:
+            self.maximo = max(self.minimo, maximo)
+            self.limite = min(self.limite, self.maximo)
+            self._cond.notify_all()
+
+    def entrar(self):
+        with self._cond:
+            while self.en_vuelo >= int(self.limite):
+                self._cond.wait()
+            self.en_vuelo += 1
+
+    def salir(self, latencia, congestion):
+        with self._cond:
+            self.en_vuelo -= 1
+
+            if congestion or latencia > self.latencia_objetivo:
+                # Un solo recorte por ventana: una ráfaga de 429 no debe
+                # colapsar el límite hasta el mínimo de golpe.
+                ahora = time.monotonic()
+                if ahora - self._ultimo_recorte >= VENTANA_RECORTE:
+                    self.limite = max(self.minimo, self.limite / 2)
+                    self._ultimo_recorte = ahora
+                self._exitos = 0
+            else:
+                # +1 por cada "ronda" completa de respuestas sanas
+                self._exitos += 1
+                if self._exitos >= int(self.limite):
+                    self.limite = min(self.maximo, self.limite + 1)
+                    self._exitos = 0
+
+            self._cond.notify_all()
+
+
+def calcular_espera_backoff(intento, retry_after=None):
+    if retry_after is not None:
+        return min(BACKOFF_MAXIMO, retry_after)
+    # Full jitter: evita que los threads reintenten sincronizados
+    return random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * (2**intento)))
+
+
+def _leer_retry_after(response):
+    if response is None:
+        return None
+    valor = response.headers.get("Retry-After")
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def _leer_estado(response):
+    try:
+        return response.json().get("status")
+    except ValueError:
+        return None
+
+
+class ClienteStreetView:
+    def __init__(
+        self,
+        api_key,
+        qps=QPS_MAXIMO,
+        concurrencia_inicial=CONCURRENCIA_INICIAL,
+        concurrencia_maxima=CONCURRENCIA_MAXIMA,
+        base_url=BASE_URL,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.limitador = LimitadorTasa(qps)
+        # Un controlador por etapa: una imagen lenta no debe recortar la
+        # concurrencia de metadata ni al revés. El QPS sí es compartido.
+        self.controladores = {
+            endpoint: ControladorAIMD(
+                inicial=concurrencia_inicial, maximo=concurrencia_maxima
+            )
+            for endpoint in ETAPAS
+        }
+        for endpoint, etapa in ETAPAS.items():
+            METRICAS.gauge(
+                "concurrencia_limite",
+                lambda c=self.controladores[endpoint]: c.limite,
+                etapa=etapa,
+            )
+
+        self.latencias = {
+            "streetview/metadata": deque(maxlen=MUESTRAS_LATENCIA),
+            "streetview": deque(maxlen=MUESTRAS_LATENCIA),
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=concurrencia_maxima * len(ETAPAS),
+            max_retries=0,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def limitar_concurrencia(self, endpoint, maximo):
+        # Más allá de los threads que llaman a este endpoint el límite no
+        # cambia nada, y cuesta varias ventanas de recorte bajarlo ante 429.
+        self.controladores[endpoint].acotar(maximo)
+
+    def _get(self, endpoint, params, timeout, con_estado=False):
+        # con_estado: la respuesta es JSON con un "status" que puede indicar
+        # cuota excedida aun con HTTP 200 (API de metadata).
+        url = f"{self.base_url}/{endpoint}"
+        params = dict(params, key=self.api_key)
+
+        controlador = self.controladores[endpoint]
+        for intento in range(MAX_REINTENTOS + 1):
+            self.limitador.adquirir()
+            controlador.entrar()
+
+            inicio = time.monotonic()
+            response = None
+            estado = None
+            congestion = False
+
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+                if response.status_code == 200:
+                    if con_estado:
+                        estado = _leer_estado(response)
+                    if estado not in ESTADOS_REINTENTABLES:
+                        return response
+
+                    # Cuota excedida con HTTP 200: es congestión igual que un 429
+                    congestion = True
+                    error = ErrorStreetView(
+                        f"Metadata con estado {estado}", reintentable=True, status_code=200
+                    )
+                else:
+                    congestion = response.status_code in CODIGOS_REINTENTABLES
+                    error = ErrorStreetView(
+                        f"HTTP {response.status_code} en {endpoint}",
+                        reintentable=congestion,
+                        status_code=response.status_code,
+                    )
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                congestion = True
+                error = ErrorStreetView(str(e), reintentable=True)
+            except requests.RequestException as e:
+                error = ErrorStreetView(str(e), reintentable=False)
+            finally:
+                latencia = time.monotonic() - inicio
+                self.latencias[endpoint].append(latencia)
+                controlador.salir(latencia, congestion)
+
+                if estado in ESTADOS_REINTENTABLES:
+                    status = estado
+                else:
+                    status = str(response.status_code) if response is not None else "error"
+                METRICAS.contar(
+                    "streetview_peticiones_total", endpoint=endpoint, status=status
+                )
+                METRICAS.observar(
+                    "streetview_latencia_segundos",
+                    latencia,
+                    endpoint=endpoint,
+                    status=status,
+                )
+
+            if not error.reintentable or intento == MAX_REINTENTOS:
+                raise error
+
+            time.sleep(calcular_espera_backoff(intento, _leer_retry_after(response)))
+
+    def metadata(self, lat, lon):
+        response = self._get(
+            "streetview/metadata",
+            {"location": f"{lat},{lon}"},
+            TIMEOUT_METADATA,
+            con_estado=True,
+        )
+        try:
+            return response.json()
+        except ValueError:
+            raise ErrorStreetView("Respuesta de metadata inválida", reintentable=False)
+
+    def panorama(self, lat, lon):
+        data = self.metadata(lat, lon)
+        status = data.get("status")
+
+        if status == "OK":
+            return data
+        if status in ESTADOS_SIN_COBERTURA:
+            return None
+
+        raise ErrorStreetView(f"Metadata con estado {status}", reintentable=False)
+
+    def verificar(self, lat, lon):
+        return self.panorama(lat, lon) is not None
+
+    def imagen(self, lat, lon, heading=0, size="640x640", fov=90, pitch=0, pano=None):
+        params = {
+            "size": size,
+            "location": f"{lat},{lon}",
+            "fov": fov,
+            "pitch": pitch,
+            "heading": heading,
+        }
+        # Con el pano_id de la metadata todas las vistas de una ubicación
+        # salen del mismo panorama verificado.
+        if pano:
+            params["pano"] = pano
+
+        response = self._get("streetview", params, TIMEOUT_IMAGEN)
+        METRICAS.contar("costo_usd_total", COSTO_POR_IMAGEN)
+        METRICAS.contar("bytes_descargados_total", len(response.content))
+        return response.content
+
+
+_CLIENTES = {}
+_CLIENTES_LOCK = threading.Lock()
+
+
+def obtener_cliente(api_key):
+    with _CLIENTES_LOCK:
+        if api_key not in _CLIENTES:
+            _CLIENTES[api_key] = ClienteStreetView(api_key)
+        return _CLIENTES[api_key]
+
+
+def verificar_street_view(lat, lon, api_key):
+    try:
+        return obtener_cliente(api_key).verificar(lat, lon)
+    except ErrorStreetView:
+        return False
+
+
+def descargar_imagen(lat, lon, api_key, filename):
+    try:
+        contenido = obtener_cliente(api_key).imagen(lat, lon)
+    except ErrorStreetView:
+        return False
+
+    with open(filename, "wb") as f:
+        f.write(contenido)
+    return True
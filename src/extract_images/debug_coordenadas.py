@@ -2,6 +2,8 @@ import osmnx as ox
 import random
 from src.extract_images.distritos_nse import (
     obtener_nse_por_coordenada,
+    etiquetar_puntos,
+    zonas_superpuestas,
     LIMA_BOUNDS,
     DISTRITOS_NSE,
 )
@@ -57,4 +59,19 @@ for lat, lon, descripcion in test_coords:
     print(f"   {descripcion}")
     print(f"      lat={lat}, lon={lon} -> distrito={distrito}, nse={nse}")
 
+print("\n6. Etiquetando todos los nodos de la red:")
+lats = [data["y"] for _, data in nodos]
+lons = [data["x"] for _, data in nodos]
+distritos, nses, coincidencias = etiquetar_puntos(lats, lons)
+etiquetados = sum(d is not None for d in distritos)
+print(f"   Nodos con zona NSE: {etiquetados}/{len(nodos)}")
+print(f"   Nodos en zonas superpuestas: {int((coincidencias > 1).sum())}")
+
+superpuestas = zonas_superpuestas()
+print(f"\n7. Zonas superpuestas (gana la primera): {len(superpuestas)} pares")
+for distrito_a, nse_a, distrito_b, nse_b in superpuestas[:10]:
+    print(
+        f"   {distrito_a.split(',')[0]} ({nse_a}) ∩ {distrito_b.split(',')[0]} ({nse_b})"
+    )
+
 print("\n" + "=" * 70)
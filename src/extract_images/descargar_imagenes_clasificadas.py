@@ -1,12 +1,20 @@
 import os
-import osmnx as ox
-import requests
-import random
+import sys
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+from src.extract_images.nodos_red import flujo_nodos
+from src.extract_images.teselado import (
+    descargador_bbox,
+    descargador_poligono,
+    red_vial_lugar_teselada,
+)
+from src.extract_images import nucleo_descarga
+from src.extract_images.nucleo_descarga import (
+    NucleoDescarga,
+    acumular_stats,
+    mostrar_resumen,
+)
 
 load_dotenv()
 
@@ -14,6 +22,8 @@ API_KEY = os.getenv("STREET_VIEW_API_KEY", "")
 
 OUTPUT_DIR = "final_images"
 
+TRABAJO = "clasificadas"
+
 DISTRITOS_POR_CATEGORIA = {
     "Alto": [
         "Miraflores, Lima, Peru",
@@ -39,196 +49,139 @@ IMAGENES_POR_DISTRITO = 1800
 
 
 def crear_estructura_directorios():
-    base_path = Path(OUTPUT_DIR)
-    base_path.mkdir(exist_ok=True)
-
-    for categoria in DISTRITOS_POR_CATEGORIA.keys():
-        categoria_path = base_path / categoria
-        categoria_path.mkdir(exist_ok=True)
-
-    print(f"📁 Estructura de directorios creada en: {base_path.absolute()}\n")
-    return base_path
+    return nucleo_descarga.crear_estructura_directorios(
+        OUTPUT_DIR, DISTRITOS_POR_CATEGORIA.keys()
+    )
 
 
 def descargar_red_vial(lugar):
     try:
-        graph = ox.graph_from_place(lugar, network_type="drive")
-        return graph
+        return red_vial_lugar_teselada(
+            lugar,
+            "drive",
+            descargador_poligono("drive"),
+            descargador_bbox("drive"),
+        )
     except Exception as e:
         print(f"      ❌ Error descargando red vial: {e}")
         return None
 
 
-def seleccionar_puntos_aleatorios(graph, n_puntos):
-    nodos = list(graph.nodes(data=True))
-    nodos_seleccionados = random.sample(nodos, min(n_puntos, len(nodos)))
-
-    puntos = []
-    for node_id, data in nodos_seleccionados:
-        lat = data["y"]
-        lon = data["x"]
-        puntos.append((lat, lon))
+def flujo_puntos_aleatorios(nodos):
+    return flujo_nodos(nodos)
 
-    return puntos
 
-
-def verificar_street_view(lat, lon, api_key):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview/metadata?"
-        f"location={lat},{lon}&key={api_key}"
-    )
-
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get("status") == "OK"
-    except:
-        return False
-
-
-def descargar_imagen(lat, lon, api_key, filename):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview?"
-        f"size=640x640&"
-        f"location={lat},{lon}&"
-        f"fov=90&"
-        f"pitch=0&"
-        f"heading=0&"
-        f"key={api_key}"
+def guardar_imagen(escritor, tarea, contenido, numero):
+    categoria = tarea["categoria"]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    ruta = (
+        Path(categoria)
+        / f"{categoria}_{tarea['distrito_corto']}_{numero:02d}_{timestamp}.jpg"
     )
 
-    try:
-        response = requests.get(url, timeout=15)
-
-        if response.status_code == 200:
-            with open(filename, "wb") as f:
-                f.write(response.content)
-            return True
-        else:
-            return False
-
-    except Exception as e:
-        return False
+    registro = {
+        "filename": ruta.as_posix(),
+        "categoria": categoria,
+        "lat": tarea["lat"],
+        "lon": tarea["lon"],
+        "distrito": tarea["distrito"],
+        "timestamp": timestamp,
+    }
+    escritor.guardar(ruta, contenido, registro)
+    return registro
 
 
-def descargar_distrito(distrito, categoria, base_path, stats_lock):
+def descargar_distrito(nucleo, distrito, categoria):
     distrito_corto = distrito.split(",")[0]
     print(f"\n📍 [{categoria}] Procesando: {distrito_corto}")
 
     print(f"   🗺️  Descargando red vial de {distrito_corto}...")
-    graph = descargar_red_vial(distrito)
+    nodos = descargar_red_vial(distrito)
 
-    if graph is None:
+    if nodos is None:
         print(f"   ❌ No se pudo descargar red vial de {distrito_corto}")
-        return {"descargadas": 0, "saltadas": IMAGENES_POR_DISTRITO}
+        return 0
 
-    n_nodos = len(graph.nodes)
+    n_nodos = len(nodos)
     print(f"   ✅ Red descargada: {n_nodos:,} intersecciones")
 
-    puntos = seleccionar_puntos_aleatorios(graph, IMAGENES_POR_DISTRITO)
-    print(f"   🎲 Seleccionados {len(puntos)} puntos aleatorios")
+    puntos = flujo_puntos_aleatorios(nodos)
+    print(f"   🎲 Muestreo sin reemplazo hasta {IMAGENES_POR_DISTRITO} imágenes")
 
-    categoria_path = base_path / categoria
-    stats_local = {"descargadas": 0, "saltadas": 0}
-
-    print(f"   📸 Descargando imágenes...")
-    imagenes_descargadas_contador = 0
-
-    for i, (lat, lon) in enumerate(puntos, 1):
-        if imagenes_descargadas_contador >= IMAGENES_POR_DISTRITO:
-            break
+    tareas = (
+        {
+            "lat": lat,
+            "lon": lon,
+            "categoria": categoria,
+            "distrito": distrito,
+            "distrito_corto": distrito_corto,
+        }
+        for lat, lon in puntos
+    )
+    nucleo.agregar_zona(
+        TRABAJO,
+        (categoria, distrito),
+        tareas,
+        cuota=IMAGENES_POR_DISTRITO,
+        zona=distrito,
+    )
 
-        print(f"      [{i}/{IMAGENES_POR_DISTRITO}] ", end="", flush=True)
+    print(f"   📸 {distrito_corto}: {n_nodos:,} candidatos planificados en lotes")
+    return n_nodos
 
-        if not verificar_street_view(lat, lon, API_KEY):
-            print("❌ No hay Street View")
-            stats_local["saltadas"] += 1
-            continue
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = (
-            categoria_path
-            / f"{categoria}_{distrito_corto}_{imagenes_descargadas_contador+1:02d}_{timestamp}.jpg"
-        )
+def zonas_planificadas():
+    return [
+        (distrito, IMAGENES_POR_DISTRITO)
+        for distritos in DISTRITOS_POR_CATEGORIA.values()
+        for distrito in distritos
+    ]
 
-        if descargar_imagen(lat, lon, API_KEY, filename):
-            imagenes_descargadas_contador += 1
-            stats_local["descargadas"] += 1
-            print(f"✅ {filename.name}")
-        else:
-            print("❌ Error al descargar")
-            stats_local["saltadas"] += 1
 
-    print(
-        f"   ✅ {distrito_corto} completado: {stats_local['descargadas']} descargadas / {stats_local['saltadas']} saltadas\n"
-    )
-    return stats_local
+def planificar_trabajo(nucleo, base_path):
+    nucleo.agregar_trabajo(TRABAJO, base_path, guardar_imagen)
 
+    # Las redes viales se descargan en el pool de preparación del núcleo; los
+    # puntos de cada distrito se reparten en lotes que todos los workers del
+    # pipeline comparten.
+    for categoria, distritos in DISTRITOS_POR_CATEGORIA.items():
+        for distrito in distritos:
+            nucleo.en_segundo_plano(descargar_distrito, nucleo, distrito, categoria)
 
-def descargar_todas_categorias(base_path):
-    print("\n" + "=" * 70)
-    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (CONCURRENTE)")
-    print("=" * 70)
 
-    stats = {
-        "descargadas": {cat: 0 for cat in DISTRITOS_POR_CATEGORIA.keys()},
-        "saltadas": {cat: 0 for cat in DISTRITOS_POR_CATEGORIA.keys()},
-        "total_descargadas": 0,
-        "total_saltadas": 0,
-    }
+def calcular_stats(trabajo):
+    for categoria, distrito in trabajo["agotados"]:
+        print(f"⚠️  {distrito.split(',')[0]}: red vial agotada antes de cumplir la cuota")
 
-    stats_lock = threading.Lock()
+    stats = acumular_stats(
+        trabajo["grupos"], lambda grupo: grupo[0], DISTRITOS_POR_CATEGORIA.keys()
+    )
 
-    tareas = []
+    # Distritos sin red vial nunca llegaron al pipeline: cuentan como cuota
+    # completa saltada.
     for categoria, distritos in DISTRITOS_POR_CATEGORIA.items():
         for distrito in distritos:
-            tareas.append((distrito, categoria))
-
-    with ThreadPoolExecutor(max_workers=12) as executor:
-        futures = {
-            executor.submit(
-                descargar_distrito, distrito, categoria, base_path, stats_lock
-            ): (distrito, categoria)
-            for distrito, categoria in tareas
-        }
-
-        for future in as_completed(futures):
-            distrito, categoria = futures[future]
-            try:
-                stats_local = future.result()
-
-                with stats_lock:
-                    stats["descargadas"][categoria] += stats_local["descargadas"]
-                    stats["saltadas"][categoria] += stats_local["saltadas"]
-                    stats["total_descargadas"] += stats_local["descargadas"]
-                    stats["total_saltadas"] += stats_local["saltadas"]
-
-            except Exception as e:
-                print(f"❌ Error procesando {distrito}: {e}")
+            if (categoria, distrito) not in trabajo["grupos"]:
+                stats["saltadas"][categoria] += IMAGENES_POR_DISTRITO
+                stats["total_saltadas"] += IMAGENES_POR_DISTRITO
 
     return stats
 
 
-def mostrar_resumen_final(stats):
+def descargar_todas_categorias(base_path):
     print("\n" + "=" * 70)
-    print("📊 RESUMEN FINAL")
-    print("=" * 70 + "\n")
+    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (CONCURRENTE)")
+    print("=" * 70)
 
-    print("Por categoría:")
-    for categoria in DISTRITOS_POR_CATEGORIA.keys():
-        desc = stats["descargadas"][categoria]
-        salt = stats["saltadas"][categoria]
-        total_esperado = len(DISTRITOS_POR_CATEGORIA[categoria]) * IMAGENES_POR_DISTRITO
-        print(
-            f"  {categoria:10s}: {desc:3d} descargadas / {salt:3d} saltadas / {total_esperado:3d} esperadas"
-        )
+    nucleo = NucleoDescarga(API_KEY).iniciar(sys.modules[__name__])
+    planificar_trabajo(nucleo, base_path)
+    trabajos = nucleo.cerrar()
 
-    print(f"\n{'=' * 70}")
-    print(f"  ✅ Total descargadas: {stats['total_descargadas']}")
-    print(f"  ❌ Total saltadas: {stats['total_saltadas']}")
-    print(f"  💰 Costo estimado: ${stats['total_descargadas'] * 0.007:.2f} USD")
-    print(f"  📁 Ubicación: {Path(OUTPUT_DIR).absolute()}")
-    print("=" * 70 + "\n")
+    return calcular_stats(trabajos[TRABAJO])
+
+
+def mostrar_resumen_final(stats):
+    mostrar_resumen(TRABAJO, stats, OUTPUT_DIR)
 
 
 def main():
@@ -1,19 +1,25 @@
 import osmnx as ox
-import requests
-import random
 from pathlib import Path
 from datetime import datetime
-import json
 import os
+import sys
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
-import threading
-from src.extract_images.distritos_nse import (
-    obtener_nse_por_coordenada,
-    obtener_todos_distritos,
-    LIMA_BOUNDS,
-    DISTRITOS_NSE,
+from functools import partial
+from itertools import chain, count, islice
+from src.extract_images.cache_grafos import red_vial_cacheada
+from src.extract_images.nodos_red import (
+    PONDERAR_CLASE,
+    IndiceNodos,
+    flujo_espaciado,
+    pesos_de_clase,
 )
+from src.extract_images import nucleo_descarga
+from src.extract_images.nucleo_descarga import (
+    NucleoDescarga,
+    acumular_stats,
+    mostrar_resumen,
+)
+from src.extract_images.distritos_nse import DISTRITOS_NSE
 
 load_dotenv()
 
@@ -21,34 +27,26 @@ API_KEY = os.getenv("STREET_VIEW_API_KEY", "")
 
 OUTPUT_DIR = "images"
 
+TRABAJO = "nse"
+
 CATEGORIAS = ["Alto", "Medio alto", "Medio", "Medio bajo", "Bajo"]
 
 IMAGENES_POR_DISTRITO = 800
 
 
 def crear_estructura_directorios():
-    base_path = Path(OUTPUT_DIR)
-    base_path.mkdir(exist_ok=True)
-
-    for categoria in CATEGORIAS:
-        categoria_path = base_path / categoria
-        categoria_path.mkdir(exist_ok=True)
-
-    print(f"📁 Estructura de directorios creada en: {base_path.absolute()}\n")
-    return base_path
+    return nucleo_descarga.crear_estructura_directorios(OUTPUT_DIR, CATEGORIAS)
 
 
-_LIMA_GRAPH_CACHE = {"drive": None, "walk": None}
+_LIMA_NODOS = {"drive": None}
 
 
 def descargar_red_vial_lima(network_type="drive"):
-    global _LIMA_GRAPH_CACHE
+    if _LIMA_NODOS.get(network_type) is not None:
+        return _LIMA_NODOS[network_type]
 
-    if _LIMA_GRAPH_CACHE[network_type] is not None:
-        return _LIMA_GRAPH_CACHE[network_type]
-
-    print(f"\n🗺️  Descargando red vial de Lima ({network_type})...")
-    print("   (Esto puede tomar 1-2 minutos, pero solo se hace una vez)")
+    print(f"\n🗺️  Cargando red vial de Lima ({network_type})...")
+    print("   (Sin cache en disco puede tomar 1-2 minutos)")
 
     try:
         from src.extract_images.distritos_nse import LIMA_BOUNDS
@@ -59,69 +57,196 @@ def descargar_red_vial_lima(network_type="drive"):
         lon_max = LIMA_BOUNDS["lon_max"]
 
         bbox = (lon_min, lat_min, lon_max, lat_max)
-        graph = ox.graph_from_bbox(bbox, network_type=network_type)
-
-        _LIMA_GRAPH_CACHE[network_type] = graph
-        print(
-            f"   ✅ Red vial descargada ({network_type}): {len(graph.nodes):,} nodos\n"
+        nodos = red_vial_cacheada(
+            (lat_min, lat_max, lon_min, lon_max),
+            network_type,
+            lambda: ox.graph_from_bbox(bbox, network_type=network_type),
         )
-        return graph
+        if nodos is None:
+            return None
+
+        _LIMA_NODOS[network_type] = nodos
+        print(f"   ✅ Red vial descargada ({network_type}): {len(nodos):,} nodos\n")
+        return nodos
     except Exception as e:
         print(f"   ❌ Error descargando red vial ({network_type}): {e}")
         return None
 
 
-def seleccionar_puntos_en_zona(
-    bbox_zona, n_puntos_objetivo, distrito, nse, graph_drive=None, graph_walk=None
-):
+_LIMA_INDICES = {}
+
+
+def indice_red_lima(network_type="drive"):
+    # El índice se arma una sola vez por red y se comparte entre zonas
+    nodos = descargar_red_vial_lima(network_type)
+    if nodos is None:
+        return None
+
+    nodos_indexados, indice = _LIMA_INDICES.get(network_type, (None, None))
+    if nodos_indexados is not nodos:
+        indice = IndiceNodos(nodos)
+        _LIMA_INDICES[network_type] = (nodos, indice)
+    return indice
+
+
+# Margen (en grados, ~200 m) alrededor de una zona al pedir su red peatonal
+MARGEN_WALK = 0.002
+
+_WALK = {"indice_drive": None, "grupos": [], "indices": {}}
+
+
+def expandir_caja(bbox, margen=MARGEN_WALK):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    return (lat_min - margen, lat_max + margen, lon_min - margen, lon_max + margen)
+
+
+def agrupar_cajas(cajas):
+    # Une cajas que se tocan: zonas vecinas sin autos comparten una sola
+    # descarga de red peatonal en vez de una por zona.
+    grupos = [(caja, [caja]) for caja in cajas]
+    unidos = True
+    while unidos:
+        unidos = False
+        for i in range(len(grupos)):
+            for j in range(i + 1, len(grupos)):
+                a, miembros_a = grupos[i]
+                b, miembros_b = grupos[j]
+                if a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]:
+                    caja = (
+                        min(a[0], b[0]),
+                        max(a[1], b[1]),
+                        min(a[2], b[2]),
+                        max(a[3], b[3]),
+                    )
+                    grupos[i] = (caja, miembros_a + miembros_b)
+                    del grupos[j]
+                    unidos = True
+                    break
+            if unidos:
+                break
+    return grupos
+
+
+def grupos_walk(indice_drive):
+    # Zonas de DISTRITOS_NSE sin nodos para autos, agrupadas por cercanía.
+    # Se calcula una vez por red drive.
+    if _WALK["indice_drive"] is not indice_drive:
+        sin_drive = [
+            bbox
+            for zonas in DISTRITOS_NSE.values()
+            for bbox, _ in zonas
+            if indice_drive is None or len(indice_drive.en_bbox(*bbox)) == 0
+        ]
+        _WALK["indice_drive"] = indice_drive
+        _WALK["grupos"] = [
+            (caja, {tuple(m) for m in miembros})
+            for caja, miembros in agrupar_cajas(
+                [expandir_caja(bbox) for bbox in sin_drive]
+            )
+        ]
+        _WALK["indices"] = {}
+        if sin_drive:
+            print(
+                f"🚶 {len(sin_drive)} zonas sin red para autos → "
+                f"{len(_WALK['grupos'])} descargas de red peatonal"
+            )
+    return _WALK["grupos"]
+
+
+def descargar_red_vial_walk(caja):
+    lat_min, lat_max, lon_min, lon_max = caja
+    bbox = (lon_min, lat_min, lon_max, lat_max)
+    try:
+        return red_vial_cacheada(
+            caja, "walk", lambda: ox.graph_from_bbox(bbox, network_type="walk")
+        )
+    except Exception as e:
+        print(f"   ❌ Error descargando red peatonal: {e}")
+        return None
+
+
+def indice_walk_zona(bbox_zona, indice_drive):
+    # Solo la red peatonal alrededor de la zona (o de su grupo de vecinas),
+    # nunca la de toda Lima.
+    expandida = expandir_caja(bbox_zona)
+    caja = expandida
+    for caja_grupo, miembros in grupos_walk(indice_drive):
+        if expandida in miembros:
+            caja = caja_grupo
+            break
+
+    if caja not in _WALK["indices"]:
+        nodos = descargar_red_vial_walk(caja)
+        _WALK["indices"][caja] = IndiceNodos(nodos) if nodos is not None else None
+    return _WALK["indices"][caja]
+
+
+def flujo_puntos_en_zona(bbox_zona, distrito, nse, indice_drive=None, indice_walk=None):
     lat_min, lat_max, lon_min, lon_max = bbox_zona
 
-    if graph_drive is None:
-        graph_drive = descargar_red_vial_lima("drive")
+    if indice_drive is None:
+        indice_drive = indice_red_lima("drive")
 
-    nodos_en_zona = []
+    indice = indice_drive
     uso_walk = False
+    posiciones = []
 
-    if graph_drive and len(graph_drive.nodes) > 0:
-        for node_id, data in graph_drive.nodes(data=True):
-            lat = data["y"]
-            lon = data["x"]
-            if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-                nodos_en_zona.append((node_id, data))
+    if indice_drive is not None:
+        posiciones = indice_drive.en_bbox(lat_min, lat_max, lon_min, lon_max)
 
-    if len(nodos_en_zona) == 0:
+    if len(posiciones) == 0:
         uso_walk = True
-        if graph_walk is None:
-            graph_walk = descargar_red_vial_lima("walk")
+        indice = indice_walk
+        if indice is None:
+            indice = indice_walk_zona(bbox_zona, indice_drive)
+        if indice is not None:
+            posiciones = indice.en_bbox(lat_min, lat_max, lon_min, lon_max)
+
+    if len(posiciones) == 0:
+        return iter(()), 0, False
+
+    lats = indice.lat[posiciones]
+    lons = indice.lon[posiciones]
+    pesos = pesos_de_clase(indice.clase[posiciones]) if PONDERAR_CLASE else None
+    flujo = (
+        (float(lats[k]), float(lons[k]), distrito, nse)
+        for k in flujo_espaciado(lats, lons, pesos=pesos)
+    )
+    return flujo, len(posiciones), uso_walk
 
-        if graph_walk and len(graph_walk.nodes) > 0:
-            for node_id, data in graph_walk.nodes(data=True):
-                lat = data["y"]
-                lon = data["x"]
-                if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-                    nodos_en_zona.append((node_id, data))
 
-    if len(nodos_en_zona) == 0:
-        return [], False
+def clave_zona(distrito, bbox_zona):
+    lat_min, lat_max, lon_min, lon_max = bbox_zona
+    return f"{distrito.split(',')[0]}|{lat_min},{lat_max},{lon_min},{lon_max}"
 
-    n_seleccion = min(n_puntos_objetivo, len(nodos_en_zona))
-    nodos_seleccionados = random.sample(nodos_en_zona, n_seleccion)
 
-    puntos = []
-    for node_id, data in nodos_seleccionados:
-        lat = data["y"]
-        lon = data["x"]
-        puntos.append((lat, lon, distrito, nse))
+def cuotas_por_zona(n_zonas, imagenes_por_distrito):
+    puntos_por_zona = max(1, imagenes_por_distrito // n_zonas)
+    puntos_restantes = imagenes_por_distrito % n_zonas
+    return [
+        puntos_por_zona + (1 if idx < puntos_restantes else 0)
+        for idx in range(n_zonas)
+    ]
 
-    return puntos, uso_walk
+
+def zonas_planificadas():
+    return [
+        (clave_zona(distrito, bbox_zona), cuota)
+        for distrito, zonas in DISTRITOS_NSE.items()
+        for (bbox_zona, _), cuota in zip(
+            zonas, cuotas_por_zona(len(zonas), IMAGENES_POR_DISTRITO)
+        )
+    ]
 
 
-def generar_dataset_por_distrito(imagenes_por_distrito):
+def generar_zonas_por_distrito(imagenes_por_distrito):
+    # Productor: cada zona se entrega apenas se muestrea, así las descargas
+    # empiezan mientras los demás distritos todavía se están procesando.
     print("\n" + "=" * 70)
-    print("🎲 GENERANDO COORDENADAS POR DISTRITO")
+    print("🎲 GENERANDO CANDIDATOS POR ZONA")
     print("=" * 70 + "\n")
 
-    dataset = {categoria: [] for categoria in CATEGORIAS}
+    cuotas_categoria = {categoria: [0, 0] for categoria in CATEGORIAS}
 
     total_distritos = len(DISTRITOS_NSE)
     distrito_actual = 0
@@ -129,13 +254,11 @@ def generar_dataset_por_distrito(imagenes_por_distrito):
     print(f"📍 Total de distritos a procesar: {total_distritos}\n")
 
     print("🚗 Descargando red vial para autos (drive)...")
-    graph_drive = descargar_red_vial_lima("drive")
+    indice_drive = indice_red_lima("drive")
 
-    if graph_drive is None:
+    if indice_drive is None:
         print("❌ No se pudo descargar la red vial de Lima. Abortando...")
-        return dataset
-
-    graph_walk = None
+        return
 
     for distrito, zonas in DISTRITOS_NSE.items():
         distrito_actual += 1
@@ -147,223 +270,144 @@ def generar_dataset_por_distrito(imagenes_por_distrito):
         )
         print(f"   Zonas NSE: {len(zonas)}")
 
-        puntos_por_zona = max(1, imagenes_por_distrito // len(zonas))
-        puntos_restantes = imagenes_por_distrito % len(zonas)
+        total_cuota_distrito = 0
 
-        total_puntos_distrito = 0
+        cuotas = cuotas_por_zona(len(zonas), imagenes_por_distrito)
+        for (bbox_zona, nse), n_puntos_zona in zip(zonas, cuotas):
 
-        for idx, (bbox_zona, nse) in enumerate(zonas):
-            n_puntos_zona = puntos_por_zona + (1 if idx < puntos_restantes else 0)
-
-            lat_min, lat_max, lon_min, lon_max = bbox_zona
-            print(f"      Zona {nse}: ", end="", flush=True)
-
-            puntos, uso_walk = seleccionar_puntos_en_zona(
-                bbox_zona, n_puntos_zona, distrito, nse, graph_drive, graph_walk
+            flujo, n_nodos, uso_walk = flujo_puntos_en_zona(
+                bbox_zona, distrito, nse, indice_drive
             )
 
-            if graph_walk is None and uso_walk:
-                graph_walk = _LIMA_GRAPH_CACHE.get("walk")
-
-            if puntos:
-                for lat, lon, dist, nse_punto in puntos:
-                    dataset[nse_punto].append((lat, lon, dist))
-
-                total_puntos_distrito += len(puntos)
-                if uso_walk:
-                    print(f"✅ {len(puntos)} puntos (🚶 walk)")
-                else:
-                    print(f"✅ {len(puntos)} puntos")
+            if n_nodos:
+                # Con espaciado mínimo no todos los nodos son utilizables: la
+                # cuota de la zona se recorta a los puntos que el flujo entrega.
+                primeros = list(islice(flujo, n_puntos_zona))
+                flujo = chain(primeros, flujo)
+                cuota = len(primeros)
+                total_cuota_distrito += cuota
+                cuotas_categoria[nse][0] += cuota
+                cuotas_categoria[nse][1] += 1
+                recorte = f" (de {n_puntos_zona})" if cuota < n_puntos_zona else ""
+                walk = " (🚶 walk)" if uso_walk else ""
+                print(
+                    f"      Zona {nse}: ✅ {n_nodos} candidatos para "
+                    f"{cuota} imágenes{recorte}{walk}"
+                )
+
+                yield nse, {
+                    "zona": clave_zona(distrito, bbox_zona),
+                    "distrito": distrito,
+                    "cuota": cuota,
+                    "candidatos": n_nodos,
+                    "puntos": flujo,
+                }
             else:
-                print(f"⚠️  Sin puntos (zona sin calles)")
+                print(f"      Zona {nse}: ⚠️  Sin puntos (zona sin calles)")
 
         print(
-            f"   Total generados en {distrito_corto}: {total_puntos_distrito} puntos\n"
+            f"   Cuota alcanzable en {distrito_corto}: {total_cuota_distrito} imágenes\n"
         )
 
     print("=" * 70)
-    print("📊 RESUMEN DE COORDENADAS GENERADAS")
+    print("📊 RESUMEN DE CUOTAS POR CATEGORÍA")
     print("=" * 70)
     for categoria in CATEGORIAS:
-        count = len(dataset[categoria])
-        print(f"  {categoria:15s}: {count:4d} puntos")
+        cuota, n_zonas = cuotas_categoria[categoria]
+        print(f"  {categoria:15s}: {cuota:4d} imágenes en {n_zonas} zonas")
     print("=" * 70 + "\n")
 
+
+def generar_zonas_por_categoria(imagenes_por_distrito):
+    # {categoria: [zona]} para descargar_imagenes_dataset. Cada zona lleva
+    # sus puntos como flujo perezoso: se puede consumir una sola vez.
+    dataset = {categoria: [] for categoria in CATEGORIAS}
+    for categoria, zona in generar_zonas_por_distrito(imagenes_por_distrito):
+        dataset[categoria].append(zona)
     return dataset
 
 
-def verificar_street_view(lat, lon, api_key):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview/metadata?"
-        f"location={lat},{lon}&key={api_key}"
-    )
+def guardar_imagen(contadores, escritor, tarea, contenido, numero):
+    categoria = tarea["categoria"]
+    numero_categoria = next(contadores[categoria])
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    ruta = Path(categoria) / f"{categoria}_{numero_categoria:04d}_{timestamp}.jpg"
 
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get("status") == "OK"
-    except:
-        return False
-
-
-def descargar_imagen(lat, lon, api_key, filename):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview?"
-        f"size=640x640&"
-        f"location={lat},{lon}&"
-        f"fov=90&"
-        f"pitch=0&"
-        f"heading=0&"
-        f"key={api_key}"
+    registro = {
+        "filename": ruta.as_posix(),
+        "categoria": categoria,
+        "lat": tarea["lat"],
+        "lon": tarea["lon"],
+        "distrito": tarea["distrito"],
+        "timestamp": timestamp,
+    }
+    escritor.guardar(ruta, contenido, registro)
+    return registro
+
+
+def tareas_zona(zona, categoria):
+    for lat, lon, distrito, nse in zona["puntos"]:
+        yield {
+            "lat": lat,
+            "lon": lon,
+            "categoria": categoria,
+            "distrito": distrito,
+        }
+
+
+def planificar_zona(nucleo, categoria, zona):
+    nucleo.agregar_zona(
+        TRABAJO,
+        (categoria, zona["zona"]),
+        tareas_zona(zona, categoria),
+        cuota=zona["cuota"],
+        zona=zona["zona"],
     )
 
-    try:
-        response = requests.get(url, timeout=15)
-
-        if response.status_code == 200:
-            with open(filename, "wb") as f:
-                f.write(response.content)
-            return True
-        else:
-            return False
-
-    except Exception as e:
-        return False
-
-
-def descargar_categoria(categoria, puntos, base_path, stats_lock, metadata_lock):
-    print(f"\n{'=' * 70}")
-    print(f"📂 [{categoria}] Iniciando descarga de {len(puntos)} puntos")
-    print(f"{'=' * 70}\n")
 
-    categoria_path = base_path / categoria
-    contador_exitos = 0
+def planificar_dataset(nucleo, dataset):
+    for categoria in CATEGORIAS:
+        print(f"📂 [{categoria}] Planificando {len(dataset[categoria])} zonas")
+        for zona in dataset[categoria]:
+            planificar_zona(nucleo, categoria, zona)
 
-    stats_local = {
-        "descargadas": 0,
-        "saltadas": 0,
-        "intentos": 0,
-    }
 
-    metadata_local = []
+def generar_y_planificar(nucleo):
+    for categoria, zona in generar_zonas_por_distrito(IMAGENES_POR_DISTRITO):
+        planificar_zona(nucleo, categoria, zona)
 
-    for i, (lat, lon, distrito) in enumerate(puntos, 1):
-        stats_local["intentos"] += 1
 
-        print(f"  [{categoria}] [{i}/{len(puntos)}] ", end="", flush=True)
+def planificar_trabajo(nucleo, base_path, dataset=None):
+    contadores = {categoria: count() for categoria in CATEGORIAS}
+    nucleo.agregar_trabajo(TRABAJO, base_path, partial(guardar_imagen, contadores))
 
-        if not verificar_street_view(lat, lon, API_KEY):
-            print("❌ No hay Street View")
-            stats_local["saltadas"] += 1
-            continue
+    if dataset is None:
+        nucleo.en_segundo_plano(generar_y_planificar, nucleo)
+    else:
+        planificar_dataset(nucleo, dataset)
 
-        timestamp = datetime.now().strftime(
-            "%Y%m%d_%H%M%S_%f"
-        )
-        filename = categoria_path / f"{categoria}_{contador_exitos:04d}_{timestamp}.jpg"
-
-        if descargar_imagen(lat, lon, API_KEY, filename):
-            contador_exitos += 1
-            stats_local["descargadas"] += 1
-
-            metadata_local.append(
-                {
-                    "filename": str(filename.relative_to(base_path)),
-                    "categoria": categoria,
-                    "lat": lat,
-                    "lon": lon,
-                    "distrito": distrito,
-                    "timestamp": timestamp,
-                }
-            )
 
-            print(f"✅ {filename.name}")
-        else:
-            print("❌ Error al descargar")
-            stats_local["saltadas"] += 1
+def calcular_stats(trabajo):
+    for categoria, zona in trabajo["agotados"]:
+        print(f"⚠️  Zona {zona} agotada antes de cumplir la cuota")
 
-    print(
-        f"\n✅ [{categoria}] Completado: {stats_local['descargadas']} descargadas, {stats_local['saltadas']} saltadas\n"
-    )
-
-    return stats_local, metadata_local
+    return acumular_stats(trabajo["grupos"], lambda grupo: grupo[0], CATEGORIAS)
 
 
 def descargar_imagenes_dataset(dataset, base_path):
     print("\n" + "=" * 70)
-    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (PARALELO)")
+    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (PIPELINE METADATA → IMAGEN)")
     print("=" * 70 + "\n")
 
-    stats = {
-        "descargadas": {cat: 0 for cat in CATEGORIAS},
-        "saltadas": {cat: 0 for cat in CATEGORIAS},
-        "total_intentos": 0,
-        "total_descargadas": 0,
-    }
-
-    metadata = []
-
-    stats_lock = threading.Lock()
-    metadata_lock = threading.Lock()
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {}
-        for categoria in CATEGORIAS:
-            puntos = dataset[categoria]
-            future = executor.submit(
-                descargar_categoria,
-                categoria,
-                puntos,
-                base_path,
-                stats_lock,
-                metadata_lock,
-            )
-            futures[future] = categoria
-
-        for future in futures:
-            categoria = futures[future]
-            try:
-                stats_local, metadata_local = future.result()
-
-                stats["descargadas"][categoria] = stats_local["descargadas"]
-                stats["saltadas"][categoria] = stats_local["saltadas"]
-                stats["total_intentos"] += stats_local["intentos"]
-                stats["total_descargadas"] += stats_local["descargadas"]
-
-                metadata.extend(metadata_local)
-
-            except Exception as e:
-                print(f"❌ Error en categoría {categoria}: {e}")
-
-    metadata_file = base_path / "metadata.json"
-    with open(metadata_file, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
-
-    print(f"\n💾 Metadata guardada en: {metadata_file}\n")
+    nucleo = NucleoDescarga(API_KEY).iniciar(sys.modules[__name__])
+    planificar_trabajo(nucleo, base_path, dataset)
+    trabajos = nucleo.cerrar()
 
-    return stats
+    return calcular_stats(trabajos[TRABAJO])
 
 
 def mostrar_resumen_final(stats):
-    print("\n" + "=" * 70)
-    print("📊 RESUMEN FINAL")
-    print("=" * 70 + "\n")
-
-    print("Por categoría:")
-    for categoria in CATEGORIAS:
-        desc = stats["descargadas"][categoria]
-        salt = stats["saltadas"][categoria]
-        total = desc + salt
-        print(
-            f"  {categoria:15s}: {desc:3d} descargadas / {salt:3d} saltadas / {total:3d} total"
-        )
-
-    print(f"\n{'=' * 70}")
-    print(f"  ✅ Total descargadas: {stats['total_descargadas']}")
-    print(f"  ❌ Total saltadas: {sum(stats['saltadas'].values())}")
-    print(f"  💰 Costo estimado: ${stats['total_descargadas'] * 0.007:.2f} USD")
-    print(f"  📁 Ubicación: {Path(OUTPUT_DIR).absolute()}")
-    print("=" * 70 + "\n")
+    mostrar_resumen(TRABAJO, stats, OUTPUT_DIR)
 
 
 def main():
@@ -381,9 +425,7 @@ def main():
 
     base_path = crear_estructura_directorios()
 
-    dataset = generar_dataset_por_distrito(IMAGENES_POR_DISTRITO)
-
-    stats = descargar_imagenes_dataset(dataset, base_path)
+    stats = descargar_imagenes_dataset(None, base_path)
 
     mostrar_resumen_final(stats)
 
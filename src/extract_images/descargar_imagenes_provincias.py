@@ -1,12 +1,21 @@
 import os
-import osmnx as ox
-import requests
-import random
+import sys
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+from src.extract_images.nodos_red import flujo_nodos
+from src.extract_images.teselado import (
+    descargador_bbox,
+    descargador_poligono,
+    red_vial_lugar_teselada,
+    red_vial_teselada,
+)
+from src.extract_images import nucleo_descarga
+from src.extract_images.nucleo_descarga import (
+    NucleoDescarga,
+    acumular_stats,
+    mostrar_resumen,
+)
 
 load_dotenv()
 
@@ -14,6 +23,10 @@ API_KEY = os.getenv("STREET_VIEW_API_KEY", "")
 
 OUTPUT_DIR = "imagenes_provincias"
 
+TRABAJO = "provincias"
+
+CATEGORIAS = ["Alto", "Medio", "Bajo"]
+
 URBANIZACIONES_POR_CIUDAD = {
     "Arequipa": {
         "Alto": [
@@ -63,269 +76,168 @@ IMAGENES_POR_URBANIZACION = 10
 
 
 def crear_estructura_directorios():
-    base_path = Path(OUTPUT_DIR)
-    base_path.mkdir(exist_ok=True)
-
-    for categoria in ["Alto", "Medio", "Bajo"]:
-        categoria_path = base_path / categoria
-        categoria_path.mkdir(exist_ok=True)
-
-    print(f"📁 Estructura de directorios creada en: {base_path.absolute()}\n")
-    return base_path
-
-
-def descargar_red_vial_lima():
-    print("\n🗺️  Descargando red vial de Lima Metropolitana como base...")
-    print("   (Esto puede tomar 1-2 minutos)\n")
-
-    try:
-        bbox = (-77.15, -12.40, -76.90, -11.80)
-        graph = ox.graph_from_bbox(
-            north=-11.80,
-            south=-12.40,
-            east=-76.90,
-            west=-77.15,
-            network_type="drive",
-        )
-
-        print(f"✅ Red vial descargada: {len(graph.nodes):,} intersecciones\n")
-        return graph
-
-    except Exception as e:
-        print(f"❌ Error descargando red vial: {e}")
-        return None
+    return nucleo_descarga.crear_estructura_directorios(OUTPUT_DIR, CATEGORIAS)
 
 
 def descargar_red_vial_bbox(bbox):
-    lat_min, lat_max, lon_min, lon_max = bbox
-
     try:
-        graph = ox.graph_from_bbox(
-            bbox=(lat_max, lat_min, lon_max, lon_min),
-            network_type="drive",
-        )
-        return graph
+        return red_vial_teselada(bbox, "drive", descargador_bbox("drive"))
     except Exception as e:
         print(f"      ⚠️  Error descargando bbox: {e}")
         return None
 
 
-def seleccionar_puntos_aleatorios(graph, n_puntos):
-    if graph is None or len(graph.nodes) == 0:
-        return []
+def descargar_red_vial_urbanizacion(bbox_o_distrito):
+    if isinstance(bbox_o_distrito, str):
+        print(f"   🗺️  Descargando red vial del distrito: {bbox_o_distrito}")
+        try:
+            return red_vial_lugar_teselada(
+                bbox_o_distrito,
+                "drive",
+                descargador_poligono("drive"),
+                descargador_bbox("drive"),
+            )
+        except Exception as e:
+            print(f"   ❌ Error descargando distrito: {e}")
+            return None
 
-    nodos = list(graph.nodes(data=True))
-    nodos_seleccionados = random.sample(nodos, min(n_puntos, len(nodos)))
+    print(f"   🗺️  Descargando red vial de bounding box...")
+    return descargar_red_vial_bbox(bbox_o_distrito)
 
-    puntos = []
-    for node_id, data in nodos_seleccionados:
-        lat = data["y"]
-        lon = data["x"]
-        puntos.append((lat, lon))
 
-    return puntos
+def flujo_puntos_aleatorios(nodos):
+    if nodos is None or len(nodos) == 0:
+        return iter(())
 
+    return flujo_nodos(nodos)
 
-def verificar_street_view(lat, lon, api_key):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview/metadata?"
-        f"location={lat},{lon}&key={api_key}"
-    )
 
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        return data.get("status") == "OK"
-    except:
-        return False
-
-
-def descargar_imagen(lat, lon, api_key, filename):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview?"
-        f"size=640x640&"
-        f"location={lat},{lon}&"
-        f"fov=90&"
-        f"pitch=0&"
-        f"heading=0&"
-        f"key={api_key}"
+def guardar_imagen(escritor, tarea, contenido, numero):
+    categoria = tarea["categoria"]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    ruta = (
+        Path(categoria)
+        / f"{tarea['ciudad']}_{categoria}_{tarea['urbanizacion']}_{numero:02d}_{timestamp}.jpg"
     )
 
-    try:
-        response = requests.get(url, timeout=15)
-
-        if response.status_code == 200:
-            with open(filename, "wb") as f:
-                f.write(response.content)
-            return True
-        else:
-            return False
-
-    except Exception as e:
-        return False
+    registro = {
+        "filename": ruta.as_posix(),
+        "categoria": categoria,
+        "lat": tarea["lat"],
+        "lon": tarea["lon"],
+        "ciudad": tarea["ciudad"],
+        "urbanizacion": tarea["urbanizacion"],
+        "timestamp": timestamp,
+    }
+    escritor.guardar(ruta, contenido, registro)
+    return registro
 
 
-def descargar_urbanizacion(urbanizacion_nombre, bbox_o_distrito, ciudad, categoria, base_path, stats_lock):
+def descargar_urbanizacion(nucleo, urbanizacion_nombre, bbox_o_distrito, ciudad, categoria):
     print(f"\n📍 [{ciudad} - {categoria}] Procesando: {urbanizacion_nombre}")
 
-    if isinstance(bbox_o_distrito, str):
-        print(f"   🗺️  Descargando red vial del distrito: {bbox_o_distrito}")
-        try:
-            graph = ox.graph_from_place(bbox_o_distrito, network_type="drive")
-        except Exception as e:
-            print(f"   ❌ Error descargando distrito: {e}")
-            graph = None
-    else:
-        print(f"   🗺️  Descargando red vial de bounding box...")
-        graph = descargar_red_vial_bbox(bbox_o_distrito)
+    nodos = descargar_red_vial_urbanizacion(bbox_o_distrito)
 
-    if graph is None or len(graph.nodes) == 0:
+    if nodos is None or len(nodos) == 0:
         print(f"   ❌ No se pudo descargar red vial o no hay calles en esta zona")
-        return {"descargadas": 0, "saltadas": IMAGENES_POR_URBANIZACION}
+        return 0
 
-    n_nodos = len(graph.nodes)
+    n_nodos = len(nodos)
     print(f"   ✅ Red descargada: {n_nodos:,} intersecciones")
 
-    puntos = seleccionar_puntos_aleatorios(graph, IMAGENES_POR_URBANIZACION)
-    print(f"   🎲 Seleccionados {len(puntos)} puntos aleatorios")
-
-    categoria_path = base_path / categoria
-    stats_local = {"descargadas": 0, "saltadas": 0}
-
-    print(f"   📸 Descargando imágenes...")
-    imagenes_descargadas_contador = 0
+    puntos = flujo_puntos_aleatorios(nodos)
+    print(f"   🎲 Muestreo sin reemplazo hasta {IMAGENES_POR_URBANIZACION} imágenes")
+
+    tareas = (
+        {
+            "lat": lat,
+            "lon": lon,
+            "ciudad": ciudad,
+            "categoria": categoria,
+            "urbanizacion": urbanizacion_nombre,
+        }
+        for lat, lon in puntos
+    )
+    nucleo.agregar_zona(
+        TRABAJO,
+        (ciudad, categoria, urbanizacion_nombre),
+        tareas,
+        cuota=IMAGENES_POR_URBANIZACION,
+        zona=f"{ciudad}/{urbanizacion_nombre}",
+    )
 
-    for i, (lat, lon) in enumerate(puntos, 1):
-        if imagenes_descargadas_contador >= IMAGENES_POR_URBANIZACION:
-            break
+    return n_nodos
 
-        print(f"      [{i}/{IMAGENES_POR_URBANIZACION}] ", end="", flush=True)
 
-        if not verificar_street_view(lat, lon, API_KEY):
-            print("❌ No hay Street View")
-            stats_local["saltadas"] += 1
-            continue
+def zonas_planificadas():
+    return [
+        (f"{ciudad}/{urb_nombre}", IMAGENES_POR_URBANIZACION)
+        for ciudad, categorias in URBANIZACIONES_POR_CIUDAD.items()
+        for urbanizaciones in categorias.values()
+        for urb_nombre, _ in urbanizaciones
+    ]
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = (
-            categoria_path
-            / f"{ciudad}_{categoria}_{urbanizacion_nombre}_{imagenes_descargadas_contador+1:02d}_{timestamp}.jpg"
-        )
 
-        if descargar_imagen(lat, lon, API_KEY, filename):
-            imagenes_descargadas_contador += 1
-            stats_local["descargadas"] += 1
-            print(f"✅ {filename.name}")
-        else:
-            print("❌ Error al descargar")
-            stats_local["saltadas"] += 1
+def planificar_trabajo(nucleo, base_path):
+    nucleo.agregar_trabajo(TRABAJO, base_path, guardar_imagen)
 
-    print(
-        f"   ✅ {urbanizacion_nombre} completado: {stats_local['descargadas']} descargadas / {stats_local['saltadas']} saltadas\n"
-    )
-    return stats_local
+    for ciudad, categorias in URBANIZACIONES_POR_CIUDAD.items():
+        for categoria, urbanizaciones in categorias.items():
+            for urb_nombre, bbox_o_distrito in urbanizaciones:
+                nucleo.en_segundo_plano(
+                    descargar_urbanizacion,
+                    nucleo,
+                    urb_nombre,
+                    bbox_o_distrito,
+                    ciudad,
+                    categoria,
+                )
 
 
-def descargar_categoria_ciudad(ciudad, categoria, urbanizaciones, base_path, stats_lock):
-    print(f"\n🔵 [{ciudad} - {categoria}] Thread iniciado")
+def calcular_stats(trabajo):
+    for ciudad, categoria, urbanizacion in trabajo["agotados"]:
+        print(f"⚠️  {ciudad} - {urbanizacion}: red vial agotada antes de cumplir la cuota")
 
-    stats_categoria = {"descargadas": 0, "saltadas": 0}
+    claves = [
+        (ciudad, categoria)
+        for ciudad in URBANIZACIONES_POR_CIUDAD.keys()
+        for categoria in CATEGORIAS
+    ]
+    stats = acumular_stats(trabajo["grupos"], lambda grupo: grupo[:2], claves)
 
-    for urb_nombre, bbox_o_distrito in urbanizaciones:
-        stats_local = descargar_urbanizacion(
-            urb_nombre, bbox_o_distrito, ciudad, categoria, base_path, stats_lock
-        )
-        stats_categoria["descargadas"] += stats_local["descargadas"]
-        stats_categoria["saltadas"] += stats_local["saltadas"]
+    # Urbanizaciones sin red vial nunca llegaron al pipeline
+    for ciudad, categorias in URBANIZACIONES_POR_CIUDAD.items():
+        for categoria, urbanizaciones in categorias.items():
+            for urb_nombre, _ in urbanizaciones:
+                if (ciudad, categoria, urb_nombre) not in trabajo["grupos"]:
+                    stats["saltadas"][(ciudad, categoria)] += IMAGENES_POR_URBANIZACION
+                    stats["total_saltadas"] += IMAGENES_POR_URBANIZACION
 
-    print(f"✅ [{ciudad} - {categoria}] Thread completado: {stats_categoria['descargadas']} descargadas")
-    return (ciudad, categoria, stats_categoria)
+    return stats
 
 
 def descargar_todas_urbanizaciones(base_path):
     print("\n" + "=" * 70)
-    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (9 THREADS CONCURRENTES)")
+    print("📸 DESCARGANDO IMÁGENES DE STREET VIEW (POOL COMPARTIDO)")
     print("=" * 70)
 
-    stats = {
-        "descargadas": {},
-        "saltadas": {},
-        "total_descargadas": 0,
-        "total_saltadas": 0,
-    }
-
-    for ciudad in URBANIZACIONES_POR_CIUDAD.keys():
-        stats["descargadas"][ciudad] = {"Alto": 0, "Medio": 0, "Bajo": 0}
-        stats["saltadas"][ciudad] = {"Alto": 0, "Medio": 0, "Bajo": 0}
-
-    stats_lock = threading.Lock()
-
     total_urbs = sum(
         len(urbs)
         for ciudad in URBANIZACIONES_POR_CIUDAD.values()
         for urbs in ciudad.values()
     )
-
-    print(f"\n📊 Configuración de threads:")
-    print(f"   • 1 thread por categoría-ciudad = 9 threads totales")
     print(f"   • Urbanizaciones totales: {total_urbs}")
     print(f"   • Imágenes esperadas: {total_urbs * IMAGENES_POR_URBANIZACION}\n")
 
-    with ThreadPoolExecutor(max_workers=9) as executor:
-        futures = {}
+    nucleo = NucleoDescarga(API_KEY).iniciar(sys.modules[__name__])
+    planificar_trabajo(nucleo, base_path)
+    trabajos = nucleo.cerrar()
 
-        for ciudad, categorias in URBANIZACIONES_POR_CIUDAD.items():
-            for categoria, urbanizaciones in categorias.items():
-                future = executor.submit(
-                    descargar_categoria_ciudad,
-                    ciudad,
-                    categoria,
-                    urbanizaciones,
-                    base_path,
-                    stats_lock,
-                )
-                futures[future] = (ciudad, categoria)
-
-        for future in as_completed(futures):
-            ciudad, categoria = futures[future]
-            try:
-                ciudad_result, categoria_result, stats_local = future.result()
-
-                with stats_lock:
-                    stats["descargadas"][ciudad][categoria] = stats_local["descargadas"]
-                    stats["saltadas"][ciudad][categoria] = stats_local["saltadas"]
-                    stats["total_descargadas"] += stats_local["descargadas"]
-                    stats["total_saltadas"] += stats_local["saltadas"]
-
-            except Exception as e:
-                print(f"❌ Error en thread [{ciudad} - {categoria}]: {e}")
-
-    return stats
+    return calcular_stats(trabajos[TRABAJO])
 
 
 def mostrar_resumen_final(stats):
-    print("\n" + "=" * 70)
-    print("📊 RESUMEN FINAL")
-    print("=" * 70 + "\n")
-
-    print("Por ciudad y categoría:")
-    for ciudad in URBANIZACIONES_POR_CIUDAD.keys():
-        print(f"\n  {ciudad}:")
-        for categoria in ["Alto", "Medio", "Bajo"]:
-            desc = stats["descargadas"][ciudad][categoria]
-            salt = stats["saltadas"][ciudad][categoria]
-            n_urbs = len(URBANIZACIONES_POR_CIUDAD[ciudad][categoria])
-            total_esperado = n_urbs * IMAGENES_POR_URBANIZACION
-            print(
-                f"    {categoria:10s}: {desc:3d} descargadas / {salt:3d} saltadas / {total_esperado:3d} esperadas"
-            )
-
-    print(f"\n{'=' * 70}")
-    print(f"  ✅ Total descargadas: {stats['total_descargadas']}")
-    print(f"  ❌ Total saltadas: {stats['total_saltadas']}")
-    print(f"  💰 Costo estimado: ${stats['total_descargadas'] * 0.007:.2f} USD")
-    print(f"  📁 Ubicación: {Path(OUTPUT_DIR).absolute()}")
-    print("=" * 70 + "\n")
+    mostrar_resumen(TRABAJO, stats, OUTPUT_DIR)
 
 
 def main():
@@ -288,6 +288,132 @@ def obtener_nse_por_coordenada(lat, lon):
     return (None, None)
 
 
+CELDA_INDICE = 0.01
+
+_INDICE_ZONAS = None
+
+
+def _indice_zonas():
+    # Grilla uniforme sobre todas las zonas: cada celda guarda, en el orden de
+    # DISTRITOS_NSE, las zonas que la tocan. Se arma una vez, al primer uso.
+    global _INDICE_ZONAS
+    if _INDICE_ZONAS is not None:
+        return _INDICE_ZONAS
+
+    import numpy as np
+
+    zonas = [
+        (distrito, nse, bbox)
+        for distrito, lista in DISTRITOS_NSE.items()
+        for bbox, nse in lista
+    ]
+    cajas = np.array([bbox for _, _, bbox in zonas], dtype=np.float64)
+    origen_lat = cajas[:, 0].min()
+    origen_lon = cajas[:, 2].min()
+    # Misma cuenta que en etiquetar_puntos para que un punto en el borde de
+    # una caja caiga en una celda que la incluye.
+    def fila(lat):
+        return int(np.floor((lat - origen_lat) / CELDA_INDICE))
+
+    def columna(lon):
+        return int(np.floor((lon - origen_lon) / CELDA_INDICE))
+
+    n_lat = fila(cajas[:, 1].max()) + 1
+    n_lon = columna(cajas[:, 3].max()) + 1
+
+    celdas = [[] for _ in range(n_lat * n_lon)]
+    for i, (lat_min, lat_max, lon_min, lon_max) in enumerate(cajas):
+        f0, f1 = fila(lat_min), fila(lat_max)
+        c0, c1 = columna(lon_min), columna(lon_max)
+        for f in range(f0, f1 + 1):
+            for c in range(c0, c1 + 1):
+                celdas[f * n_lon + c].append(i)
+
+    conteos = np.array([len(c) for c in celdas], dtype=np.int64)
+    _INDICE_ZONAS = {
+        "zonas": zonas,
+        "cajas": cajas,
+        "origen": (origen_lat, origen_lon),
+        "forma": (n_lat, n_lon),
+        "inicios": np.concatenate([[0], np.cumsum(conteos)[:-1]]),
+        "conteos": conteos,
+        "candidatas": np.array([i for c in celdas for i in c], dtype=np.int64),
+    }
+    return _INDICE_ZONAS
+
+
+def etiquetar_puntos(lats, lons):
+    # Distrito y NSE de muchos puntos a la vez, con la misma semántica que
+    # obtener_nse_por_coordenada (gana la primera zona en DISTRITOS_NSE).
+    # Devuelve (distritos, nses, coincidencias): coincidencias > 1 marca
+    # puntos que caen en zonas superpuestas.
+    import numpy as np
+
+    indice = _indice_zonas()
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    cajas = indice["cajas"]
+    n_lat, n_lon = indice["forma"]
+
+    fila = np.floor((lats - indice["origen"][0]) / CELDA_INDICE)
+    columna = np.floor((lons - indice["origen"][1]) / CELDA_INDICE)
+    dentro = (fila >= 0) & (fila < n_lat) & (columna >= 0) & (columna < n_lon)
+    celda = np.where(dentro, fila * n_lon + columna, 0).astype(np.int64)
+
+    inicios = indice["inicios"][celda]
+    conteos = np.where(dentro, indice["conteos"][celda], 0)
+
+    elegida = np.full(len(lats), -1, dtype=np.int64)
+    coincidencias = np.zeros(len(lats), dtype=np.int64)
+
+    # Las candidatas de cada celda están en orden de DISTRITOS_NSE: la
+    # primera que contiene al punto es la que devolvería el recorrido lineal.
+    for k in range(int(conteos.max(initial=0))):
+        activos = np.flatnonzero(conteos > k)
+        zona = indice["candidatas"][inicios[activos] + k]
+        caja = cajas[zona]
+        dentro_caja = (
+            (lats[activos] >= caja[:, 0])
+            & (lats[activos] <= caja[:, 1])
+            & (lons[activos] >= caja[:, 2])
+            & (lons[activos] <= caja[:, 3])
+        )
+        aciertos = activos[dentro_caja]
+        coincidencias[aciertos] += 1
+        primeros = aciertos[elegida[aciertos] < 0]
+        elegida[primeros] = zona[dentro_caja][elegida[aciertos] < 0]
+
+    distritos = np.array([z[0] for z in indice["zonas"]] + [None], dtype=object)
+    nses = np.array([z[1] for z in indice["zonas"]] + [None], dtype=object)
+    return distritos[elegida], nses[elegida], coincidencias
+
+
+def zonas_superpuestas():
+    # Pares de zonas cuyas cajas se intersectan: en esos puntos decide el
+    # orden de DISTRITOS_NSE.
+    indice = _indice_zonas()
+    zonas = indice["zonas"]
+    cajas = indice["cajas"]
+
+    pares = set()
+    for inicio, conteo in zip(indice["inicios"], indice["conteos"]):
+        candidatas = indice["candidatas"][inicio : inicio + conteo]
+        for a_pos, a in enumerate(candidatas):
+            for b in candidatas[a_pos + 1 :]:
+                if (
+                    cajas[a, 0] < cajas[b, 1]
+                    and cajas[b, 0] < cajas[a, 1]
+                    and cajas[a, 2] < cajas[b, 3]
+                    and cajas[b, 2] < cajas[a, 3]
+                ):
+                    pares.add((int(a), int(b)))
+
+    return [
+        (zonas[a][0], zonas[a][1], zonas[b][0], zonas[b][1])
+        for a, b in sorted(pares)
+    ]
+
+
 def obtener_todos_distritos():
     return list(DISTRITOS_NSE.keys())
 
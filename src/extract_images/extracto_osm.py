@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.extract_images.cache_grafos import (
+    DIRECTORIO_CACHE,
+    cargar_nodos,
+    guardar_nodos,
+)
+from src.extract_images.nodos_red import (
+    CLASE_DESCONOCIDA,
+    DTYPE_SEGMENTOS,
+    IndiceNodos,
+    candidatos,
+    clase_via,
+    crear_nodos,
+)
+
+load_dotenv()
+
+# Extracto .osm.pbf local (p. ej. peru-latest.osm.pbf de Geofabrik). Si está
+# definido, las redes viales salen de él y no se consulta Overpass: vacío
+# desactiva.
+ARCHIVO_PBF = os.getenv("ARCHIVO_PBF", "")
+
+FORMATO_EXTRACTO = 1
+
+# Región, provincia y distrito en los límites administrativos de Perú
+NIVELES_ADMIN = {"4", "6", "8"}
+
+# Los mismos filtros que usa osmnx para "drive" y "walk"
+HIGHWAY_EXCLUIDAS = {
+    "drive": {
+        "abandoned", "bridleway", "bus_guideway", "construction", "corridor",
+        "cycleway", "elevator", "escalator", "footway", "no", "path",
+        "pedestrian", "planned", "platform", "proposed", "raceway", "razed",
+        "service", "steps", "track",
+    },
+    "walk": {
+        "abandoned", "bus_guideway", "construction", "cycleway", "motor", "no",
+        "planned", "platform", "proposed", "raceway", "razed",
+    },
+}
+SERVICE_EXCLUIDOS = {
+    "drive": {
+        "alley", "driveway", "emergency_access", "parking", "parking_aisle",
+        "private",
+    },
+    "walk": {"private"},
+}
+REDES = ("drive", "walk")
+
+_LOCK = threading.Lock()
+_REDES = {}
+_LIMITES = {}
+
+
+def pasa_filtro(tags, network_type):
+    highway = tags.get("highway")
+    if not highway or tags.get("area") == "yes" or tags.get("access") == "private":
+        return False
+    if highway in HIGHWAY_EXCLUIDAS[network_type]:
+        return False
+    if tags.get("service") in SERVICE_EXCLUIDOS[network_type]:
+        return False
+    if network_type == "drive":
+        return tags.get("motor_vehicle") != "no" and tags.get("motorcar") != "no"
+    return tags.get("foot") != "no"
+
+
+def _archivo_extracto(archivo_pbf, sufijo, directorio=DIRECTORIO_CACHE):
+    # El tamaño y la fecha del pbf entran en la clave: un extracto nuevo se
+    # vuelve a procesar solo.
+    archivo_pbf = Path(archivo_pbf)
+    info = archivo_pbf.stat()
+    clave = json.dumps(
+        [archivo_pbf.name, info.st_size, info.st_mtime_ns, FORMATO_EXTRACTO]
+    )
+    resumen = hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12]
+    nombre = "".join(c if c.isalnum() else "_" for c in archivo_pbf.name)
+    return Path(directorio) / f"pbf_{nombre}_{sufijo}_{resumen}"
+
+
+def _importar_osmium():
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError(
+            "Leer ARCHIVO_PBF requiere pyosmium: pip install osmium"
+        ) from None
+    return osmium
+
+
+def leer_vias(archivo_pbf):
+    # Una sola pasada por el pbf: se guardan las vías de drive y walk como
+    # arreglos planos de referencias (id, lat, lon) más el inicio, la clase y
+    # las redes de cada vía. Nada de objetos por nodo.
+    osmium = _importar_osmium()
+
+    class Lector(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.ids = array("q")
+            self.lat = array("d")
+            self.lon = array("d")
+            self.inicios = array("q")
+            self.clases = array("b")
+            self.redes = array("b")
+
+        def way(self, w):
+            tags = w.tags
+            if "highway" not in tags:
+                return
+            redes = sum(
+                1 << i for i, red in enumerate(REDES) if pasa_filtro(tags, red)
+            )
+            if not redes:
+                return
+
+            inicio = len(self.ids)
+            for n in w.nodes:
+                if n.location.valid():
+                    self.ids.append(n.ref)
+                    self.lat.append(n.location.lat)
+                    self.lon.append(n.location.lon)
+            if len(self.ids) - inicio < 2:
+                # Vía cortada por el borde del extracto
+                del self.ids[inicio:], self.lat[inicio:], self.lon[inicio:]
+                return
+
+            self.inicios.append(inicio)
+            self.clases.append(clase_via(tags.get("highway")))
+            self.redes.append(redes)
+
+    lector = Lector()
+    lector.apply_file(str(archivo_pbf), locations=True)
+    return {
+        "ids": np.frombuffer(lector.ids, dtype=np.int64),
+        "lat": np.frombuffer(lector.lat, dtype=np.float64),
+        "lon": np.frombuffer(lector.lon, dtype=np.float64),
+        "inicios": np.frombuffer(lector.inicios, dtype=np.int64),
+        "clases": np.frombuffer(lector.clases, dtype=np.int8),
+        "redes": np.frombuffer(lector.redes, dtype=np.int8),
+    }
+
+
+def red_de_vias(vias, network_type):
+    # Como osmnx al simplificar: quedan los extremos de cada vía y los nodos
+    # compartidos por más de una; los tramos entre referencias consecutivas
+    # conservan la geometría completa para muestrear sobre las aristas.
+    total = len(vias["ids"])
+    largos = np.diff(np.append(vias["inicios"], total))
+    via = np.repeat(np.arange(len(largos)), largos)
+    en_red = ((vias["redes"] >> REDES.index(network_type)) & 1).astype(bool)[via]
+
+    ids = vias["ids"][en_red]
+    lat = vias["lat"][en_red]
+    lon = vias["lon"][en_red]
+    clase = vias["clases"][via][en_red]
+    via = via[en_red]
+    if len(ids) == 0:
+        return crear_nodos([], []), np.zeros(0, dtype=DTYPE_SEGMENTOS)
+
+    extremo = np.ones(len(ids), dtype=bool)
+    extremo[1:-1] = (via[1:-1] != via[:-2]) | (via[1:-1] != via[2:])
+
+    orden = np.argsort(ids, kind="stable")
+    unicos, primeros, repeticiones = np.unique(
+        ids[orden], return_index=True, return_counts=True
+    )
+    es_extremo = np.logical_or.reduceat(extremo[orden], primeros)
+    # La clase del nodo es la de su vía más importante
+    clase_orden = np.where(clase[orden] == CLASE_DESCONOCIDA, 127, clase[orden])
+    clase_nodo = np.minimum.reduceat(clase_orden, primeros)
+    clase_nodo = np.where(clase_nodo == 127, CLASE_DESCONOCIDA, clase_nodo)
+
+    queda = (repeticiones > 1) | es_extremo
+    posicion = orden[primeros[queda]]
+    nodos = crear_nodos(
+        lat[posicion], lon[posicion], ids=unicos[queda], clase=clase_nodo[queda]
+    )
+
+    mismo_tramo = via[:-1] == via[1:]
+    segmentos = np.zeros(int(mismo_tramo.sum()), dtype=DTYPE_SEGMENTOS)
+    segmentos["lat0"] = lat[:-1][mismo_tramo]
+    segmentos["lon0"] = lon[:-1][mismo_tramo]
+    segmentos["lat1"] = lat[1:][mismo_tramo]
+    segmentos["lon1"] = lon[1:][mismo_tramo]
+    segmentos["clase"] = clase[:-1][mismo_tramo]
+    return nodos, segmentos
+
+
+class RedLocal:
+    # Nodos y tramos de todo el extracto con un índice por latitud cada uno:
+    # una caja se resuelve con dos searchsorted, sin volver a leer el pbf.
+    def __init__(self, nodos, segmentos):
+        self.nodos = nodos
+        self.segmentos = segmentos
+        self.indice_nodos = IndiceNodos(nodos)
+        self.indice_segmentos = IndiceNodos(
+            crear_nodos(
+                (segmentos["lat0"] + segmentos["lat1"]) / 2,
+                (segmentos["lon0"] + segmentos["lon1"]) / 2,
+            )
+        )
+
+    def en_bbox(self, bbox):
+        # Un tramo entra si su punto medio cae en la caja
+        indice_n, indice_s = self.indice_nodos, self.indice_segmentos
+        nodos = self.nodos[indice_n.orden[indice_n.en_bbox(*bbox)]]
+        segmentos = self.segmentos[indice_s.orden[indice_s.en_bbox(*bbox)]]
+        return nodos, segmentos
+
+
+def red_local(network_type, archivo_pbf=ARCHIVO_PBF):
+    with _LOCK:
+        clave = (str(archivo_pbf), network_type)
+        if clave in _REDES:
+            return _REDES[clave]
+
+        archivos = {
+            red: _archivo_extracto(archivo_pbf, red).with_suffix(".npz")
+            for red in REDES
+        }
+        red = cargar_nodos(archivos[network_type], ttl_dias=float("inf"))
+        if red is None:
+            print(f"\n📦 Procesando extracto OSM {Path(archivo_pbf).name}...")
+            print("   (Una sola vez por extracto: puede tomar varios minutos)")
+            vias = leer_vias(archivo_pbf)
+            for nombre, archivo in archivos.items():
+                nodos, segmentos = red_de_vias(vias, nombre)
+                try:
+                    guardar_nodos(archivo, nodos, segmentos)
+                except OSError as e:
+                    print(f"   ⚠️  No se pudo guardar el extracto procesado: {e}")
+                _REDES[(str(archivo_pbf), nombre)] = RedLocal(nodos, segmentos)
+                print(f"   ✅ Red {nombre}: {len(nodos):,} nodos")
+            del vias
+            return _REDES[clave]
+
+        _REDES[clave] = RedLocal(*red)
+        return _REDES[clave]
+
+
+def normalizar_nombre(nombre):
+    sin_tildes = unicodedata.normalize("NFKD", nombre)
+    sin_tildes = "".join(c for c in sin_tildes if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def leer_limites(archivo_pbf):
+    # Segunda lectura, solo la primera vez que se pide un lugar por nombre:
+    # armar polígonos de límites exige la pasada de relaciones de osmium.
+    osmium = _importar_osmium()
+
+    class Lector(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.wkb = osmium.geom.WKBFactory()
+            self.limites = []
+
+        def area(self, a):
+            tags = a.tags
+            if tags.get("boundary") != "administrative":
+                return
+            nivel = tags.get("admin_level")
+            if nivel not in NIVELES_ADMIN or "name" not in tags:
+                return
+            try:
+                wkb = self.wkb.create_multipolygon(a)
+            except RuntimeError:
+                return
+            self.limites.append({"nombre": tags["name"], "nivel": nivel, "wkb": wkb})
+
+    lector = Lector()
+    lector.apply_file(str(archivo_pbf), locations=True)
+    return lector.limites
+
+
+def limites_locales(archivo_pbf=ARCHIVO_PBF):
+    import shapely
+
+    with _LOCK:
+        clave = str(archivo_pbf)
+        if clave in _LIMITES:
+            return _LIMITES[clave]
+
+        archivo = _archivo_extracto(archivo_pbf, "limites").with_suffix(".json")
+        if archivo.exists():
+            with open(archivo, encoding="utf-8") as f:
+                limites = json.load(f)
+        else:
+            print(f"\n📦 Leyendo límites administrativos de {Path(archivo_pbf).name}...")
+            limites = leer_limites(archivo_pbf)
+            try:
+                archivo.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=archivo.parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(limites, f, ensure_ascii=False)
+                os.replace(tmp, archivo)
+            except OSError as e:
+                print(f"   ⚠️  No se pudieron guardar los límites: {e}")
+
+        _LIMITES[clave] = [
+            (normalizar_nombre(l["nombre"]), int(l["nivel"]), shapely.from_wkb(l["wkb"]))
+            for l in limites
+        ]
+        return _LIMITES[clave]
+
+
+def poligono_de_lugar(lugar, archivo_pbf=ARCHIVO_PBF):
+    # "Miraflores, Lima, Peru" → polígono del distrito. Se prefiere el nivel
+    # más fino con ese nombre y el resto del texto desempata: cada parte que
+    # sea un límite conocido tiene que contener al candidato (hay Miraflores
+    # en Lima y en Arequipa).
+    limites = limites_locales(archivo_pbf)
+    partes = [normalizar_nombre(p) for p in lugar.split(",")]
+    nombre, contexto = partes[0], partes[1:]
+
+    candidatos_lugar = sorted(
+        (l for l in limites if l[0] == nombre), key=lambda l: -l[1]
+    )
+    for _, nivel, poligono in candidatos_lugar:
+        punto = poligono.representative_point()
+        if all(
+            any(
+                n == parte and nivel_padre < nivel and padre.contains(punto)
+                for n, nivel_padre, padre in limites
+            )
+            for parte in contexto
+            if any(n == parte for n, _, _ in limites)
+        ):
+            return poligono
+    return None
+
+
+def red_vial_local(lugar, network_type, archivo_pbf=ARCHIVO_PBF):
+    # lugar: nombre ("Catacaos, Piura, Peru") o caja
+    # (lat_min, lat_max, lon_min, lon_max). Devuelve los candidatos igual que
+    # red_vial_cacheada.
+    import shapely
+
+    red = red_local(network_type, archivo_pbf)
+    if not isinstance(lugar, str):
+        nodos, segmentos = red.en_bbox(lugar)
+    else:
+        poligono = poligono_de_lugar(lugar, archivo_pbf)
+        if poligono is None:
+            print(f"   ⚠️  '{lugar}' no está entre los límites del extracto")
+            return None
+        lon_min, lat_min, lon_max, lat_max = poligono.bounds
+        nodos, segmentos = red.en_bbox((lat_min, lat_max, lon_min, lon_max))
+        nodos = nodos[shapely.contains_xy(poligono, nodos["lon"], nodos["lat"])]
+        segmentos = segmentos[
+            shapely.contains_xy(
+                poligono,
+                (segmentos["lon0"] + segmentos["lon1"]) / 2,
+                (segmentos["lat0"] + segmentos["lat1"]) / 2,
+            )
+        ]
+
+    return candidatos(nodos, segmentos)
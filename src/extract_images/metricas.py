@@ -0,0 +1,259 @@
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INTERVALO_REPORTE = float(os.getenv("INTERVALO_REPORTE", "10"))
+ARCHIVO_PROMETHEUS = os.getenv("ARCHIVO_PROMETHEUS")
+DEBUG = os.getenv("DESCARGA_DEBUG", "0") == "1"
+
+LIMITES_LATENCIA = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+def debug(mensaje):
+    # Salida por punto: solo con DESCARGA_DEBUG=1, para no serializar los
+    # threads en stdout durante una corrida normal.
+    if DEBUG:
+        print(mensaje, flush=True)
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+class Metricas:
+    def __init__(self):
+        # Cada thread acumula en sus propios dicts sin lock; solo se toma el
+        # lock para registrar un thread nuevo y al armar una instantánea.
+        self._local = threading.local()
+        self._locales = []
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+
+    def _propios(self):
+        propios = getattr(self._local, "datos", None)
+        if propios is None:
+            propios = {"contadores": {}, "histogramas": {}}
+            self._local.datos = propios
+            with self._lock:
+                self._locales.append(propios)
+        return propios
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        contadores = self._propios()["contadores"]
+        clave = _clave(nombre, etiquetas)
+        contadores[clave] = contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        histogramas = self._propios()["histogramas"]
+        clave = _clave(nombre, etiquetas)
+        h = histogramas.get(clave)
+        if h is None:
+            h = histogramas[clave] = [0] * len(LIMITES_LATENCIA) + [0.0]
+        h[bisect_left(LIMITES_LATENCIA, valor)] += 1
+        h[-1] += valor
+
+    def gauge(self, nombre, funcion, **etiquetas):
+        # Los gauges se leen al armar la instantánea (tamaño de colas,
+        # límite de concurrencia...), así los workers no pagan nada.
+        with self._lock:
+            self._gauges[_clave(nombre, etiquetas)] = funcion
+
+    def instantanea(self):
+        contadores = {}
+        histogramas = {}
+
+        with self._lock:
+            locales = list(self._locales)
+            gauges = dict(self._gauges)
+
+        for datos in locales:
+            for clave, valor in list(datos["contadores"].items()):
+                contadores[clave] = contadores.get(clave, 0) + valor
+            for clave, h in list(datos["histogramas"].items()):
+                total = histogramas.setdefault(clave, [0] * len(h))
+                for i, v in enumerate(list(h)):
+                    total[i] += v
+
+        valores_gauges = {}
+        for clave, funcion in gauges.items():
+            try:
+                valores_gauges[clave] = funcion()
+            except Exception:
+                continue
+
+        return {
+            "segundos": time.monotonic() - self.inicio,
+            "contadores": contadores,
+            "gauges": valores_gauges,
+            "histogramas": histogramas,
+        }
+
+    def total(self, instantanea, nombre, **filtro):
+        return sum(
+            valor
+            for (n, etiquetas), valor in instantanea["contadores"].items()
+            if n == nombre and all(e in etiquetas for e in filtro.items())
+        )
+
+    def exportar_prometheus(self, archivo, instantanea=None):
+        instantanea = instantanea or self.instantanea()
+        lineas = []
+
+        def formato(nombre, etiquetas, extra=()):
+            pares = [f'{k}="{v}"' for k, v in list(etiquetas) + list(extra)]
+            return f"{nombre}{{{','.join(pares)}}}" if pares else nombre
+
+        for (nombre, etiquetas), valor in sorted(instantanea["contadores"].items()):
+            lineas.append(f"{formato(nombre, etiquetas)} {valor}")
+        for (nombre, etiquetas), valor in sorted(instantanea["gauges"].items()):
+            lineas.append(f"{formato(nombre, etiquetas)} {valor}")
+        for (nombre, etiquetas), h in sorted(instantanea["histogramas"].items()):
+            acumulado = 0
+            for limite, n in zip(LIMITES_LATENCIA, h):
+                acumulado += n
+                le = "+Inf" if limite == math.inf else repr(limite)
+                lineas.append(
+                    f"{formato(nombre + '_bucket', etiquetas, [('le', le)])} {acumulado}"
+                )
+            lineas.append(f"{formato(nombre + '_sum', etiquetas)} {h[-1]}")
+            lineas.append(f"{formato(nombre + '_count', etiquetas)} {acumulado}")
+
+        archivo = Path(archivo)
+        tmp = archivo.with_name(archivo.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lineas) + "\n")
+        os.replace(tmp, archivo)
+
+    def resumen(self, instantanea=None):
+        instantanea = instantanea or self.instantanea()
+
+        def etiquetar(nombre, etiquetas):
+            if not etiquetas:
+                return nombre
+            return f"{nombre}{{{','.join(f'{k}={v}' for k, v in etiquetas)}}}"
+
+        latencias = {}
+        for (nombre, etiquetas), h in instantanea["histogramas"].items():
+            n = sum(h[:-1])
+            latencias[etiquetar(nombre, etiquetas)] = {
+                "n": n,
+                "media": h[-1] / n if n else 0.0,
+                "p95": _percentil_histograma(h, 0.95),
+            }
+
+        return {
+            "segundos": round(instantanea["segundos"], 1),
+            "contadores": {
+                etiquetar(n, e): v for (n, e), v in instantanea["contadores"].items()
+            },
+            "gauges": {
+                etiquetar(n, e): v for (n, e), v in instantanea["gauges"].items()
+            },
+            "latencias": latencias,
+        }
+
+
+def _percentil_histograma(h, p):
+    n = sum(h[:-1])
+    if n == 0:
+        return 0.0
+    objetivo = p * n
+    acumulado = 0
+    for limite, cantidad in zip(LIMITES_LATENCIA, h):
+        acumulado += cantidad
+        if acumulado >= objetivo:
+            return limite
+    return math.inf
+
+
+class ReportadorProgreso:
+    def __init__(
+        self, metricas, intervalo=INTERVALO_REPORTE, archivo_prometheus=ARCHIVO_PROMETHEUS
+    ):
+        self.metricas = metricas
+        self.intervalo = intervalo
+        self.archivo_prometheus = archivo_prometheus
+        self._parar = threading.Event()
+        self._thread = None
+        self._anterior = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(
+            target=self._reportar, name="reportador", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _reportar(self):
+        while not self._parar.wait(self.intervalo):
+            self.reportar()
+
+    def reportar(self):
+        m = self.metricas
+        actual = m.instantanea()
+
+        def total(nombre, instantanea=actual, **filtro):
+            return m.total(instantanea, nombre, **filtro)
+
+        def concurrencia(etapa):
+            clave = ("concurrencia_limite", (("etapa", etapa),))
+            return actual["gauges"].get(clave, 0)
+
+        metadata = total("streetview_peticiones_total", endpoint="streetview/metadata")
+        imagenes = total("streetview_peticiones_total", endpoint="streetview")
+
+        ritmo = ""
+        if self._anterior is not None:
+            dt = max(actual["segundos"] - self._anterior["segundos"], 1e-9)
+            previas = total(
+                "streetview_peticiones_total",
+                self._anterior,
+                endpoint="streetview/metadata",
+            )
+            ritmo = f" ({(metadata - previas) / dt:.1f}/s)"
+        self._anterior = actual
+
+        print(
+            f"📈 {actual['segundos']:6.0f}s | metadata {metadata}{ritmo} | "
+            f"imágenes {imagenes} | "
+            f"ubicaciones {total('ubicaciones_total', resultado='descargada')} | "
+            f"errores {total('ubicaciones_total', resultado='error')} | "
+            f"{total('bytes_escritos_total') / 1e6:.1f} MB | "
+            f"${total('costo_usd_total'):.2f} | "
+            f"concurrencia {concurrencia('metadata'):.0f}/{concurrencia('imagen'):.0f}",
+            flush=True,
+        )
+
+        if self.archivo_prometheus:
+            try:
+                m.exportar_prometheus(self.archivo_prometheus, actual)
+            except OSError as e:
+                print(f"⚠️  No se pudo escribir {self.archivo_prometheus}: {e}")
+
+    def cerrar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.reportar()
+
+
+METRICAS = Metricas()
+
+
+def guardar_resumen(archivo, extra=None, metricas=METRICAS):
+    resumen = metricas.resumen()
+    if extra:
+        resumen.update(extra)
+
+    with open(archivo, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False, default=str)
+    return resumen
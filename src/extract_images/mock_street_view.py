@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+PUERTO = 8765
+
+COBERTURA = 0.6
+LATENCIA_MEDIANA_MS = 80.0
+LATENCIA_SIGMA = 0.5
+TASA_ERROR = 0.01
+TASA_429 = 0.02
+BYTES_IMAGEN = 45_000
+
+
+def generar_jpeg(n_bytes, size=(640, 640)):
+    img = Image.effect_noise(size, 64).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=75)
+    contenido = buffer.getvalue()
+
+    # Se rellena con segmentos COM (ignorados por los decodificadores) para
+    # que todas las respuestas pesen exactamente lo mismo.
+    relleno = b""
+    faltan = n_bytes - len(contenido)
+    while faltan > 4:
+        n = min(faltan - 4, 65533)
+        relleno += b"\xff\xfe" + (n + 2).to_bytes(2, "big") + b"\x00" * n
+        faltan -= n + 4
+
+    return contenido[:2] + relleno + contenido[2:]
+
+
+def hay_cobertura(location, cobertura):
+    # Determinista por coordenada: metadata e imagen siempre coinciden
+    digest = hashlib.blake2b(location.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64 < cobertura
+
+
+class ConfigMock:
+    def __init__(
+        self,
+        cobertura=COBERTURA,
+        latencia_mediana_ms=LATENCIA_MEDIANA_MS,
+        latencia_sigma=LATENCIA_SIGMA,
+        tasa_error=TASA_ERROR,
+        tasa_429=TASA_429,
+        bytes_imagen=BYTES_IMAGEN,
+    ):
+        self.cobertura = cobertura
+        self.latencia_mediana_ms = latencia_mediana_ms
+        self.latencia_sigma = latencia_sigma
+        self.tasa_error = tasa_error
+        self.tasa_429 = tasa_429
+        self.imagen = generar_jpeg(bytes_imagen)
+
+        self.conteos = {}
+        self._lock = threading.Lock()
+
+    def contar(self, endpoint, status):
+        with self._lock:
+            clave = f"{endpoint} {status}"
+            self.conteos[clave] = self.conteos.get(clave, 0) + 1
+
+
+class ManejadorMock(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, endpoint, status, cuerpo, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in (headers or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        self.server.config.contar(endpoint, status)
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        location = params.get("location", [""])[0]
+
+        if url.path.endswith("/streetview/metadata"):
+            endpoint = "metadata"
+        elif url.path.endswith("/streetview"):
+            endpoint = "imagen"
+        else:
+            self._responder("otro", 404, b"", "text/plain")
+            return
+
+        latencia = random.lognormvariate(0, config.latencia_sigma)
+        time.sleep(config.latencia_mediana_ms * latencia / 1000)
+
+        r = random.random()
+        if r < config.tasa_429:
+            self._responder(endpoint, 429, b"", "text/plain", {"Retry-After": "1"})
+            return
+        if r < config.tasa_429 + config.tasa_error:
+            self._responder(endpoint, 500, b"", "text/plain")
+            return
+
+        # Un pano_id solo puede venir de una metadata OK
+        cubierto = "pano" in params or hay_cobertura(location, config.cobertura)
+
+        if endpoint == "metadata":
+            if cubierto:
+                lat, _, lon = location.partition(",")
+                data = {
+                    "status": "OK",
+                    "pano_id": hashlib.md5(location.encode()).hexdigest()[:22],
+                    "location": {"lat": float(lat), "lng": float(lon)},
+                    "date": "2023-05",
+                    "copyright": "© Mock",
+                }
+            else:
+                data = {"status": "ZERO_RESULTS"}
+            self._responder(
+                endpoint, 200, json.dumps(data).encode(), "application/json"
+            )
+        elif cubierto:
+            self._responder(endpoint, 200, config.imagen, "image/jpeg")
+        else:
+            self._responder(endpoint, 404, b"", "text/plain")
+
+
+def crear_servidor(puerto=PUERTO, host="127.0.0.1", **config):
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorMock)
+    servidor.daemon_threads = True
+    servidor.config = ConfigMock(**config)
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita Street View")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--cobertura", type=float, default=COBERTURA)
+    parser.add_argument("--latencia-ms", type=float, default=LATENCIA_MEDIANA_MS)
+    parser.add_argument("--sigma", type=float, default=LATENCIA_SIGMA)
+    parser.add_argument("--tasa-error", type=float, default=TASA_ERROR)
+    parser.add_argument("--tasa-429", type=float, default=TASA_429)
+    parser.add_argument("--bytes", type=int, default=BYTES_IMAGEN)
+    args = parser.parse_args()
+
+    servidor = crear_servidor(
+        args.puerto,
+        cobertura=args.cobertura,
+        latencia_mediana_ms=args.latencia_ms,
+        latencia_sigma=args.sigma,
+        tasa_error=args.tasa_error,
+        tasa_429=args.tasa_429,
+        bytes_imagen=args.bytes,
+    )
+
+    print(f"🧪 Mock de Street View en http://127.0.0.1:{args.puerto}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(servidor.config.conteos, indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+ARCHIVO_COBERTURA = os.getenv("ARCHIVO_COBERTURA", "cobertura_street_view.json")
+
+COBERTURA_PRIOR = 0.6
+PESO_PRIOR = 20
+COBERTURA_MINIMA = 0.05
+MARGEN_SOBREMUESTREO = 1.15
+
+
+class EstimadorCobertura:
+    def __init__(self, archivo=ARCHIVO_COBERTURA):
+        self.archivo = Path(archivo)
+        self.zonas = {}
+        self._lock = threading.Lock()
+
+        if self.archivo.exists():
+            try:
+                with open(self.archivo, "r", encoding="utf-8") as f:
+                    self.zonas = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No se pudo leer {self.archivo}: {e}")
+
+    def registrar(self, zona, hay_cobertura):
+        with self._lock:
+            z = self.zonas.setdefault(zona, {"consultas": 0, "con_cobertura": 0})
+            z["consultas"] += 1
+            if hay_cobertura:
+                z["con_cobertura"] += 1
+
+    def tasa(self, zona):
+        with self._lock:
+            z = self.zonas.get(zona, {"consultas": 0, "con_cobertura": 0})
+            tasa = (z["con_cobertura"] + COBERTURA_PRIOR * PESO_PRIOR) / (
+                z["consultas"] + PESO_PRIOR
+            )
+        return max(COBERTURA_MINIMA, tasa)
+
+    def candidatos_necesarios(self, zona, faltantes):
+        if faltantes <= 0:
+            return 0
+        return math.ceil(faltantes * MARGEN_SOBREMUESTREO / self.tasa(zona))
+
+    def guardar(self):
+        with self._lock:
+            contenido = json.dumps(self.zonas, indent=2, ensure_ascii=False)
+
+        tmp = self.archivo.with_name(self.archivo.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(contenido)
+        os.replace(tmp, self.archivo)
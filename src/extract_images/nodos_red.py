@@ -0,0 +1,253 @@
+import math
+import os
+import random
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Nodos más cercanos que esto suelen devolver el mismo panorama: 0 desactiva
+DISTANCIA_MINIMA_M = float(os.getenv("DISTANCIA_MINIMA_M", "25"))
+
+# "nodos": intersecciones. "aristas": puntos a lo largo de las calles, uno
+# cada PASO_ARISTA_M metros.
+MUESTREO = os.getenv("MUESTREO", "nodos")
+PASO_ARISTA_M = float(os.getenv("PASO_ARISTA_M", "10"))
+PONDERAR_CLASE = os.getenv("PONDERAR_CLASE", "0") == "1"
+
+METROS_POR_GRADO = 111_320
+
+# Solo lo que los muestreadores leen de la red: id, coordenadas y la clase de
+# la vía más importante que pasa por el nodo. ~25 bytes por nodo frente a los
+# KB que ocupa un nodo de osmnx con sus aristas y geometrías.
+DTYPE_NODOS = np.dtype(
+    [("id", np.int64), ("lat", np.float64), ("lon", np.float64), ("clase", np.int8)]
+)
+
+CLASES_VIA = {
+    "motorway": 1,
+    "trunk": 2,
+    "primary": 3,
+    "secondary": 4,
+    "tertiary": 5,
+    "residential": 6,
+    "unclassified": 7,
+    "living_street": 8,
+    "service": 9,
+}
+CLASE_OTRA = 10
+CLASE_DESCONOCIDA = 0
+
+# Vías rápidas pesan menos: sus imágenes se parecen entre sí y poco dicen del
+# barrio.
+PESOS_CLASE = np.array(
+    # desconocida, motorway, trunk, primary, secondary, tertiary,
+    # residential, unclassified, living_street, service, otra
+    [1.0, 0.1, 0.2, 0.5, 0.7, 0.9, 1.0, 1.0, 1.0, 0.5, 0.5]
+)
+
+# Tramos rectos de las geometrías de las aristas, ya sin la arista inversa
+DTYPE_SEGMENTOS = np.dtype(
+    [
+        ("lat0", np.float64),
+        ("lon0", np.float64),
+        ("lat1", np.float64),
+        ("lon1", np.float64),
+        ("clase", np.int8),
+    ]
+)
+
+
+def clase_via(highway):
+    # osmnx deja listas cuando una arista simplificada junta varias vías
+    if isinstance(highway, (list, tuple)):
+        return min((clase_via(h) for h in highway), default=CLASE_DESCONOCIDA)
+    if not highway:
+        return CLASE_DESCONOCIDA
+    return CLASES_VIA.get(highway.replace("_link", ""), CLASE_OTRA)
+
+
+def crear_nodos(lat, lon, ids=None, clase=None):
+    nodos = np.zeros(len(lat), dtype=DTYPE_NODOS)
+    nodos["id"] = np.arange(len(lat)) if ids is None else ids
+    nodos["lat"] = lat
+    nodos["lon"] = lon
+    if clase is not None:
+        nodos["clase"] = clase
+    return nodos
+
+
+def nodos_de_grafo(graph):
+    # Se extrae una vez y el grafo puede liberarse enseguida
+    n = len(graph)
+    posicion = {node_id: i for i, node_id in enumerate(graph.nodes)}
+    clase = np.full(n, CLASE_DESCONOCIDA, dtype=np.int8)
+
+    for u, v, data in graph.edges(data=True):
+        c = clase_via(data.get("highway"))
+        if c == CLASE_DESCONOCIDA:
+            continue
+        for nodo in (posicion[u], posicion[v]):
+            if clase[nodo] == CLASE_DESCONOCIDA or c < clase[nodo]:
+                clase[nodo] = c
+
+    return crear_nodos(
+        np.fromiter((d["y"] for _, d in graph.nodes(data=True)), np.float64, n),
+        np.fromiter((d["x"] for _, d in graph.nodes(data=True)), np.float64, n),
+        ids=np.fromiter(graph.nodes, np.int64, n),
+        clase=clase,
+    )
+
+
+def segmentos_de_grafo(graph):
+    vistas = set()
+    lat0, lon0, lat1, lon1, clases = [], [], [], [], []
+
+    for u, v, data in graph.edges(data=True):
+        # Una calle de doble sentido son dos aristas con la misma geometría
+        clave = (min(u, v), max(u, v), round(data.get("length", 0.0), 2))
+        if clave in vistas:
+            continue
+        vistas.add(clave)
+
+        if "geometry" in data:
+            coords = list(data["geometry"].coords)
+        else:
+            coords = [
+                (graph.nodes[u]["x"], graph.nodes[u]["y"]),
+                (graph.nodes[v]["x"], graph.nodes[v]["y"]),
+            ]
+
+        c = clase_via(data.get("highway"))
+        for (x0, y0), (x1, y1) in zip(coords[:-1], coords[1:]):
+            lat0.append(y0)
+            lon0.append(x0)
+            lat1.append(y1)
+            lon1.append(x1)
+            clases.append(c)
+
+    segmentos = np.zeros(len(lat0), dtype=DTYPE_SEGMENTOS)
+    segmentos["lat0"] = lat0
+    segmentos["lon0"] = lon0
+    segmentos["lat1"] = lat1
+    segmentos["lon1"] = lon1
+    segmentos["clase"] = clases
+    return segmentos
+
+
+def puntos_en_segmentos(segmentos, paso_m=PASO_ARISTA_M):
+    # Puntos cada paso_m a lo largo del largo acumulado de todos los tramos:
+    # la densidad es uniforme por metro de calle, no por esquina ni por
+    # vértice (un tramo de 1 m solo recibe un punto si le cae uno encima).
+    if len(segmentos) == 0:
+        return crear_nodos([], [])
+
+    lat0, lon0 = segmentos["lat0"], segmentos["lon0"]
+    lat1, lon1 = segmentos["lat1"], segmentos["lon1"]
+    escala_lon = np.cos(np.radians((lat0 + lat1) / 2))
+    largo = np.hypot(
+        (lat1 - lat0) * METROS_POR_GRADO, (lon1 - lon0) * METROS_POR_GRADO * escala_lon
+    )
+    acumulado = np.cumsum(largo)
+
+    posiciones = np.arange(paso_m / 2, acumulado[-1], paso_m)
+    tramo = np.minimum(
+        np.searchsorted(acumulado, posiciones, side="right"), len(segmentos) - 1
+    )
+    t = (posiciones - (acumulado[tramo] - largo[tramo])) / np.maximum(largo[tramo], 1e-9)
+
+    return crear_nodos(
+        lat0[tramo] + t * (lat1[tramo] - lat0[tramo]),
+        lon0[tramo] + t * (lon1[tramo] - lon0[tramo]),
+        ids=np.full(len(tramo), -1),
+        clase=segmentos["clase"][tramo],
+    )
+
+
+def candidatos(nodos, segmentos, muestreo=MUESTREO):
+    if muestreo == "aristas" and segmentos is not None and len(segmentos):
+        return puntos_en_segmentos(segmentos)
+    return nodos
+
+
+def pesos_de_clase(clase):
+    return PESOS_CLASE[np.clip(clase, 0, len(PESOS_CLASE) - 1)]
+
+
+def flujo_espaciado(
+    lat, lon, distancia_minima=DISTANCIA_MINIMA_M, rng=random, pesos=None
+):
+    # Posiciones en orden aleatorio, sin repetir y a más de distancia_minima
+    # de las ya entregadas: Fisher-Yates incremental que compara cada
+    # candidato solo con los aceptados de su celda y las 8 vecinas.
+    n = len(lat)
+    posiciones = np.arange(n)
+
+    if pesos is not None and n:
+        # Con pesos el orden se fija de una vez, vectorizado, con las claves
+        # u^(1/w) de Efraimidis-Spirakis (muestreo ponderado sin reemplazo)
+        rng_np = np.random.default_rng(rng.getrandbits(64))
+        claves = rng_np.random(n) ** (1.0 / np.maximum(pesos, 1e-9))
+        posiciones = np.argsort(-claves, kind="stable")
+
+    if distancia_minima > 0 and n:
+        escala_lon = math.cos(math.radians(float(np.mean(lat))))
+        y = np.asarray(lat, dtype=np.float64) * METROS_POR_GRADO
+        x = np.asarray(lon, dtype=np.float64) * METROS_POR_GRADO * escala_lon
+        filas = np.floor(y / distancia_minima).astype(np.int64).tolist()
+        columnas = np.floor(x / distancia_minima).astype(np.int64).tolist()
+        x = x.tolist()
+        y = y.tolist()
+        limite = distancia_minima * distancia_minima
+        aceptados = {}
+
+    for i in range(n):
+        if pesos is None:
+            j = rng.randrange(i, n)
+            posiciones[i], posiciones[j] = posiciones[j], posiciones[i]
+        k = int(posiciones[i])
+
+        if distancia_minima > 0:
+            fila, columna = filas[k], columnas[k]
+            if any(
+                (x[k] - xa) ** 2 + (y[k] - ya) ** 2 < limite
+                for df in (-1, 0, 1)
+                for dc in (-1, 0, 1)
+                for xa, ya in aceptados.get((fila + df, columna + dc), ())
+            ):
+                continue
+            aceptados.setdefault((fila, columna), []).append((x[k], y[k]))
+
+        yield k
+
+
+def flujo_nodos(nodos, rng=random, distancia_minima=DISTANCIA_MINIMA_M):
+    # Baraja posiciones en un arreglo de enteros en vez de copiar la red a
+    # una lista de tuplas.
+    lat = nodos["lat"]
+    lon = nodos["lon"]
+    pesos = pesos_de_clase(nodos["clase"]) if PONDERAR_CLASE else None
+    for k in flujo_espaciado(lat, lon, distancia_minima, rng, pesos):
+        yield float(lat[k]), float(lon[k])
+
+
+class IndiceNodos:
+    # Coordenadas de los nodos en arreglos contiguos ordenados por latitud:
+    # una consulta por bbox es un searchsorted más una máscara sobre la
+    # franja de latitudes, en vez de recorrer el grafo entero en Python.
+    def __init__(self, nodos):
+        self.orden = np.argsort(nodos["lat"], kind="stable")
+        self.lat = nodos["lat"][self.orden]
+        self.lon = nodos["lon"][self.orden]
+        self.clase = nodos["clase"][self.orden]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def en_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        # Posiciones (dentro del índice) de los nodos en la caja, bordes incluidos
+        inicio = np.searchsorted(self.lat, lat_min, side="left")
+        fin = np.searchsorted(self.lat, lat_max, side="right")
+        franja = self.lon[inicio:fin]
+        return inicio + np.flatnonzero((franja >= lon_min) & (franja <= lon_max))
@@ -0,0 +1,392 @@
+import argparse
+import importlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.extract_images.cliente_street_view import COSTO_POR_IMAGEN
+from src.extract_images.metricas import METRICAS, ReportadorProgreso, guardar_resumen
+from src.extract_images.muestreo_adaptativo import EstimadorCobertura
+from src.extract_images.pipeline_descarga import (
+    VISTAS_POR_UBICACION,
+    PipelineDescarga,
+)
+from src.extract_images.planificador_lotes import PlanificadorLotes
+from src.extract_images.presupuesto import GuardiaPresupuesto, estimar, mostrar_plan
+from src.extract_images.registro_ubicaciones import (
+    ARCHIVO_REGISTRO,
+    RegistroUbicaciones,
+)
+from src.extract_images.salida_imagenes import crear_escritor
+
+load_dotenv()
+
+API_KEY = os.getenv("STREET_VIEW_API_KEY", "")
+
+WORKERS_REDES = 12
+ARCHIVO_RESUMEN = "resumen_ejecucion.json"
+
+TRABAJOS = {
+    "nse": "src.extract_images.descargar_imagenes_nse",
+    "clasificadas": "src.extract_images.descargar_imagenes_clasificadas",
+    "provincias": "src.extract_images.descargar_imagenes_provincias",
+}
+
+
+def crear_estructura_directorios(output_dir, categorias):
+    base_path = Path(output_dir)
+    base_path.mkdir(exist_ok=True)
+
+    for categoria in categorias:
+        categoria_path = base_path / categoria
+        categoria_path.mkdir(exist_ok=True)
+
+    print(f"📁 Estructura de directorios creada en: {base_path.absolute()}\n")
+    return base_path
+
+
+class EscrituraPendiente:
+    # Envuelve al escritor del trabajo y junta los Futures de las escrituras
+    # asíncronas (ProcesadorImagenes) que dispara un guardar().
+    def __init__(self, escritor):
+        self.escritor = escritor
+        self.futuros = []
+
+    def guardar(self, ruta, contenido, metadata=None):
+        futuro = self.escritor.guardar(ruta, contenido, metadata)
+        if futuro is not None:
+            self.futuros.append(futuro)
+
+
+def cuando_terminen(futuros, funcion):
+    # funcion(futuros) corre una sola vez, cuando el último termina
+    pendientes = [len(futuros)]
+    lock = threading.Lock()
+
+    def terminado(_):
+        with lock:
+            pendientes[0] -= 1
+            ultimo = pendientes[0] == 0
+        if ultimo:
+            funcion(futuros)
+
+    for futuro in futuros:
+        futuro.add_done_callback(terminado)
+
+
+class EscritorVistas:
+    # Recibe el único guardar() que hace cada trabajo y lo convierte en un
+    # archivo por heading, agrupados en un solo registro de metadata.
+    def __init__(self, escritor, vistas):
+        self.escritor = escritor
+        self.vistas = vistas
+
+    def guardar(self, ruta, contenido, metadata=None):
+        ruta = Path(ruta)
+        entradas = []
+        self.copias = []
+
+        for heading, contenido_vista in self.vistas:
+            ruta_vista = ruta.with_name(f"{ruta.stem}_h{heading:03d}{ruta.suffix}")
+            entradas.append({"heading": heading, "filename": ruta_vista.as_posix()})
+            copia = dict(metadata or {}, heading=heading, filename=ruta_vista.as_posix())
+            self.copias.append(copia)
+            self.escritor.guardar(ruta_vista, contenido_vista, copia)
+
+        if metadata is not None:
+            metadata["filename"] = entradas[0]["filename"]
+            metadata["vistas"] = entradas
+
+    def unir_transformaciones(self, metadata):
+        # ProcesadorImagenes anota la transformación en la copia de cada
+        # vista: se lleva a su entrada en "vistas" del registro compartido.
+        for entrada, copia in zip(metadata.get("vistas", ()), self.copias):
+            if "transformacion" in copia:
+                entrada["transformacion"] = copia["transformacion"]
+
+
+class NucleoDescarga:
+    def __init__(self, api_key, workers_redes=WORKERS_REDES):
+        # Un solo cliente, limitador, pipeline y planificador para todos los
+        # trabajos: varias campañas a la vez comparten el mismo presupuesto
+        # de QPS y de threads en vez de sumar cada uno el suyo.
+        self.estimador = EstimadorCobertura()
+        self.guardia = GuardiaPresupuesto()
+        # ARCHIVO_REGISTRO vacío desactiva la deduplicación entre campañas
+        self.registro = RegistroUbicaciones() if ARCHIVO_REGISTRO else None
+        self.pipeline = PipelineDescarga(
+            api_key,
+            self._guardar,
+            estimador=self.estimador,
+            guardia=self.guardia,
+            registro=self.registro,
+        )
+        self.planificador = PlanificadorLotes(self.pipeline, estimador=self.estimador)
+        self.reportador = ReportadorProgreso(METRICAS)
+        self.trabajos = {}
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers_redes, thread_name_prefix="redes"
+        )
+        self._lock = threading.Lock()
+
+    def iniciar(self, *modulos):
+        # modulos: campañas que se van a agregar; su plan de costo se muestra
+        # antes de gastar la primera llamada, entren por donde entren.
+        if modulos:
+            planificar_costos(modulos, self.estimador, self.guardia)
+        self.pipeline.iniciar()
+        self.planificador.iniciar()
+        self.reportador.iniciar()
+        return self
+
+    def agregar_trabajo(self, nombre, base_path, guardar):
+        self.trabajos[nombre] = {
+            "base_path": Path(base_path),
+            "escritor": crear_escritor(base_path),
+            "guardar": guardar,
+            "metadata": [],
+            "grupos": {},
+            "agotados": [],
+        }
+
+    def agregar_zona(self, trabajo, grupo, tareas, cuota, zona=None):
+        clave = (trabajo, grupo)
+        if zona is None:
+            zona = f"{trabajo}/{grupo}"
+        origen = str(self.trabajos[trabajo]["base_path"].absolute())
+        tareas = (
+            dict(tarea, grupo=clave, trabajo=trabajo, zona=zona, origen=origen)
+            for tarea in tareas
+        )
+        self.planificador.agregar(clave, tareas, cuota=cuota, zona=zona)
+
+    def en_segundo_plano(self, funcion, *args):
+        # Descargas de redes viales y generación de candidatos: trabajo de
+        # preparación que no debe ocupar threads del pipeline.
+        return self._executor.submit(self._ejecutar, funcion, *args)
+
+    def _ejecutar(self, funcion, *args):
+        try:
+            return funcion(*args)
+        except Exception as e:
+            print(f"❌ Error en {funcion.__name__}: {e}")
+            return None
+
+    def _guardar(self, tarea, vistas, numero):
+        # Devuelve el registro, o un Future con él si la escritura es
+        # asíncrona: metadata y registro de ubicaciones solo reciben
+        # imágenes que ya están en disco.
+        t = self.trabajos[tarea["trabajo"]]
+        escritura = EscrituraPendiente(t["escritor"])
+        escritor_vistas = None
+
+        if len(vistas) == 1:
+            _, contenido = vistas[0]
+            registro = t["guardar"](escritura, tarea, contenido, numero)
+        else:
+            escritor_vistas = EscritorVistas(escritura, vistas)
+            registro = t["guardar"](escritor_vistas, tarea, vistas[0][1], numero)
+
+        if registro is not None:
+            registro["pano_id"] = tarea.get("pano_id")
+            if "reutilizar" in tarea:
+                registro["reutilizada_de"] = tarea["reutilizar"]["origen"]
+
+        if not escritura.futuros:
+            self._registrar(t, tarea, vistas, registro, escritor_vistas)
+            return registro
+
+        resultado = Future()
+
+        def terminar(futuros):
+            errores = [f.exception() for f in futuros if f.exception() is not None]
+            if errores:
+                resultado.set_exception(errores[0])
+                return
+            try:
+                self._registrar(t, tarea, vistas, registro, escritor_vistas)
+            except Exception as e:
+                resultado.set_exception(e)
+            else:
+                resultado.set_result(registro)
+
+        cuando_terminen(escritura.futuros, terminar)
+        return resultado
+
+    def _registrar(self, t, tarea, vistas, registro, escritor_vistas=None):
+        if registro is None:
+            return
+        if escritor_vistas is not None:
+            escritor_vistas.unir_transformaciones(registro)
+
+        with self._lock:
+            t["metadata"].append(registro)
+
+        if self.registro is not None:
+            self.registro.registrar(
+                tarea["lat"],
+                tarea["lon"],
+                tarea["origen"],
+                tarea["trabajo"],
+                registro.get("vistas")
+                or [{"heading": vistas[0][0], "filename": registro["filename"]}],
+                registro["pano_id"],
+            )
+
+    def cerrar(self):
+        # Primero deben terminar de planificarse todas las zonas; recién
+        # entonces el planificador puede dar por cerrada la cola.
+        self._executor.shutdown(wait=True)
+        self.planificador.cerrar()
+        grupos = self.pipeline.cerrar()
+        self.reportador.cerrar()
+        self.estimador.guardar()
+        self.guardia.guardar()
+        if self.registro is not None:
+            self.registro.cerrar()
+
+        if self.guardia.agotado:
+            print(f"🛑 Corrida detenida por {self.guardia.motivo}")
+
+        for (trabajo, grupo), g in grupos.items():
+            self.trabajos[trabajo]["grupos"][grupo] = g
+        for trabajo, grupo in self.planificador.agotados:
+            self.trabajos[trabajo]["agotados"].append(grupo)
+
+        for nombre, t in self.trabajos.items():
+            t["escritor"].cerrar()
+
+            metadata_file = t["base_path"] / "metadata.json"
+            with open(metadata_file, "w", encoding="utf-8") as f:
+                json.dump(t["metadata"], f, indent=2, ensure_ascii=False)
+            print(f"💾 [{nombre}] Metadata guardada en: {metadata_file}")
+
+        return self.trabajos
+
+
+def acumular_stats(grupos, categoria_de, categorias):
+    stats = {
+        "descargadas": {cat: 0 for cat in categorias},
+        "saltadas": {cat: 0 for cat in categorias},
+        "total_intentos": 0,
+        "total_descargadas": 0,
+        "total_saltadas": 0,
+        "total_reutilizadas": 0,
+    }
+
+    for grupo, g in grupos.items():
+        categoria = categoria_de(grupo)
+        stats["descargadas"][categoria] += g["descargadas"]
+        stats["saltadas"][categoria] += g["saltadas"]
+        stats["total_intentos"] += g["intentos"]
+        stats["total_descargadas"] += g["descargadas"]
+        stats["total_saltadas"] += g["saltadas"]
+        stats["total_reutilizadas"] += g["reutilizadas"]
+
+    return stats
+
+
+def mostrar_resumen(nombre, stats, output_dir):
+    def serializable(valor):
+        if isinstance(valor, dict):
+            return {
+                "/".join(k) if isinstance(k, tuple) else k: serializable(v)
+                for k, v in valor.items()
+            }
+        return valor
+
+    resumen = guardar_resumen(
+        Path(output_dir) / ARCHIVO_RESUMEN,
+        {
+            "trabajo": nombre,
+            "stats": serializable(stats),
+            "costo_estimado_usd": round(
+                (stats["total_descargadas"] - stats["total_reutilizadas"])
+                * VISTAS_POR_UBICACION
+                * COSTO_POR_IMAGEN,
+                2,
+            ),
+            "ubicacion": str(Path(output_dir).absolute()),
+        },
+    )
+
+    print("\n" + "=" * 70)
+    print(f"📊 RESUMEN FINAL [{nombre}]")
+    print("=" * 70)
+    print(
+        json.dumps(
+            {k: resumen[k] for k in ("stats", "costo_estimado_usd", "ubicacion")},
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+    print(f"💾 Resumen completo en: {Path(output_dir) / ARCHIVO_RESUMEN}")
+    print("=" * 70 + "\n")
+
+
+def planificar_costos(modulos, estimador, guardia=None):
+    planes = {
+        modulo.TRABAJO: estimar(
+            modulo.zonas_planificadas(), estimador, vistas=VISTAS_POR_UBICACION
+        )
+        for modulo in modulos
+    }
+    guardia = guardia or GuardiaPresupuesto()
+    mostrar_plan(planes, guardia.presupuesto, guardia.cuota_diaria)
+    return planes
+
+
+def ejecutar_trabajos(nombres, api_key=API_KEY):
+    modulos = [importlib.import_module(TRABAJOS[nombre]) for nombre in nombres]
+
+    nucleo = NucleoDescarga(api_key).iniciar(*modulos)
+    for modulo in modulos:
+        modulo.planificar_trabajo(nucleo, modulo.crear_estructura_directorios())
+
+    trabajos = nucleo.cerrar()
+
+    resultados = {}
+    for nombre, modulo in zip(nombres, modulos):
+        stats = modulo.calcular_stats(trabajos[modulo.TRABAJO])
+        modulo.mostrar_resumen_final(stats)
+        resultados[nombre] = stats
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ejecuta varias campañas de descarga sobre un mismo pool compartido"
+    )
+    parser.add_argument(
+        "trabajos", nargs="+", choices=list(TRABAJOS), help="Campañas a ejecutar"
+    )
+    parser.add_argument(
+        "--plan", action="store_true", help="Solo estimar llamadas, costo y tiempo"
+    )
+    args = parser.parse_args()
+
+    if args.plan:
+        modulos = [importlib.import_module(TRABAJOS[n]) for n in args.trabajos]
+        planificar_costos(modulos, EstimadorCobertura())
+        return
+
+    if not API_KEY:
+        print("❌ ERROR: Debes configurar tu STREET_VIEW_API_KEY en el archivo .env")
+        return
+
+    print("\n" + "=" * 70)
+    print(f"🌎 CAMPAÑAS DE DESCARGA: {', '.join(args.trabajos)}")
+    print("=" * 70 + "\n")
+
+    ejecutar_trabajos(args.trabajos)
+
+    print("🎉 ¡Proceso completado!")
+
+
+if __name__ == "__main__":
+    main()
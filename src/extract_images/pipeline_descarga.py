@@ -0,0 +1,573 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from src.extract_images.cliente_street_view import ErrorStreetView, obtener_cliente
+from src.extract_images.metricas import METRICAS, debug
+
+WORKERS_METADATA = 16
+WORKERS_IMAGEN = 4
+TAMANO_COLA = 64
+RESPALDO_POR_GRUPO = 2
+
+VISTAS_POR_UBICACION = int(os.getenv("VISTAS_POR_UBICACION", "1"))
+
+_FIN = object()
+
+
+def calcular_headings(vistas):
+    return [round(i * 360 / vistas) for i in range(vistas)]
+
+
+def _nueva_etapa():
+    return {"procesados": 0, "exitos": 0, "fallos": 0, "segundos": 0.0}
+
+
+def _nuevo_grupo():
+    return {
+        "cuota": None,
+        "en_cola": 0,
+        "verificando": 0,
+        "reserva": [],
+        "intentos": 0,
+        "pendientes": 0,
+        "descargadas": 0,
+        "saltadas": 0,
+        "descartadas": 0,
+        "reutilizadas": 0,
+        "numerados": 0,
+        "respaldo": [],
+    }
+
+
+class PipelineDescarga:
+    def __init__(
+        self,
+        api_key,
+        guardar,
+        workers_metadata=WORKERS_METADATA,
+        workers_imagen=WORKERS_IMAGEN,
+        tamano_cola=TAMANO_COLA,
+        estimador=None,
+        vistas=VISTAS_POR_UBICACION,
+        guardia=None,
+        registro=None,
+    ):
+        self.cliente = obtener_cliente(api_key)
+        self.guardar = guardar
+        self.estimador = estimador
+        self.guardia = guardia
+        self.registro = registro
+        self.workers_metadata = workers_metadata
+        self.workers_imagen = workers_imagen
+        self.headings = calcular_headings(vistas)
+
+        # Techo de cada controlador AIMD: los threads que de verdad hacen
+        # llamadas en cada etapa (primera vista más el pool de vistas).
+        self.cliente.limitar_concurrencia("streetview/metadata", workers_metadata)
+        self.cliente.limitar_concurrencia("streetview", workers_imagen * vistas)
+
+        # Cada worker de imagen baja la primera vista y reparte el resto en
+        # este pool, así las N vistas de una ubicación van en paralelo.
+        self._executor_vistas = None
+        if vistas > 1:
+            self._executor_vistas = ThreadPoolExecutor(
+                max_workers=workers_imagen * (vistas - 1),
+                thread_name_prefix="vistas",
+            )
+
+        # Colas acotadas: si la etapa de imágenes se satura, la de metadata
+        # se bloquea en put() y a su vez frena a los productores.
+        self.cola_candidatos = queue.Queue(maxsize=tamano_cola)
+        self.cola_imagenes = queue.Queue(maxsize=tamano_cola)
+        METRICAS.gauge("cola_tamano", self.cola_candidatos.qsize, etapa="metadata")
+        METRICAS.gauge("cola_tamano", self.cola_imagenes.qsize, etapa="imagen")
+
+        self.etapas = {"metadata": _nueva_etapa(), "imagen": _nueva_etapa()}
+        self.grupos = {}
+        self.metadata = []
+
+        self._lock = threading.Lock()
+        self._escrituras = set()
+        self._escrituras_cond = threading.Condition(self._lock)
+        self._cerrando = False
+        self._sin_metadata = False
+        self._cupo_sin_guardar = False
+        self._threads_metadata = []
+        self._threads_imagen = []
+        self._inicio = None
+
+    def iniciar(self):
+        self._inicio = time.monotonic()
+
+        for i in range(self.workers_metadata):
+            t = threading.Thread(
+                target=self._worker_metadata, name=f"metadata-{i}", daemon=True
+            )
+            t.start()
+            self._threads_metadata.append(t)
+
+        for i in range(self.workers_imagen):
+            t = threading.Thread(
+                target=self._worker_imagen, name=f"imagen-{i}", daemon=True
+            )
+            t.start()
+            self._threads_imagen.append(t)
+
+        return self
+
+    def definir_cuota(self, grupo, cuota):
+        with self._lock:
+            self.grupos.setdefault(grupo, _nuevo_grupo())["cuota"] = cuota
+
+    def enviar(self, tarea):
+        with self._lock:
+            self.grupos.setdefault(tarea["grupo"], _nuevo_grupo())["en_cola"] += 1
+        self.cola_candidatos.put(tarea)
+
+    @property
+    def detenido(self):
+        return self.guardia is not None and self.guardia.agotado
+
+    def _reservar(self):
+        # Debe llamarse con el lock tomado: el archivo de cuota se escribe
+        # después, en _guardar_cupo, para no hacer I/O con el lock.
+        if self.guardia is None:
+            return True
+        reservado, guardar = self.guardia.apartar(len(self.headings))
+        self._cupo_sin_guardar = self._cupo_sin_guardar or guardar
+        return reservado
+
+    def _guardar_cupo(self):
+        with self._lock:
+            guardar = self._cupo_sin_guardar
+            self._cupo_sin_guardar = False
+        if guardar:
+            self.guardia.guardar()
+
+    def grupo_completo(self, grupo):
+        with self._lock:
+            return self._grupo_completo(self.grupos[grupo])
+
+    def grupo_cumplido(self, grupo):
+        with self._lock:
+            g = self.grupos[grupo]
+            return g["cuota"] is not None and g["descargadas"] >= g["cuota"]
+
+    def necesita_candidatos(self, grupo):
+        with self._lock:
+            return self._necesita_candidatos(self.grupos[grupo])
+
+    def demanda(self, grupo):
+        # Candidatos en vuelo: en la cola y los que los workers de metadata
+        # ya están verificando.
+        with self._lock:
+            g = self.grupos[grupo]
+            en_vuelo = g["en_cola"] + g["verificando"]
+            if g["cuota"] is None:
+                return None, en_vuelo
+            return g["cuota"] - g["descargadas"] - g["pendientes"], en_vuelo
+
+    def _grupo_completo(self, g):
+        return g["cuota"] is not None and g["descargadas"] + g["pendientes"] >= g["cuota"]
+
+    def _necesita_candidatos(self, g):
+        # Con el cupo reservado no se verifican puntos de respaldo por
+        # adelantado: si una imagen falla, su cupo se libera y el grupo
+        # vuelve a pedir candidatos.
+        return not self._grupo_completo(g)
+
+    def _necesita_verificar(self, tarea, g):
+        # Debe llamarse con el lock tomado. Además del cupo, cuenta los
+        # puntos que otros workers ya están verificando: si con la cobertura
+        # esperada de la zona alcanzan, no se paga otra consulta todavía.
+        if self.estimador is None or g["cuota"] is None or not g["verificando"]:
+            return True
+        tasa = self.estimador.tasa(tarea.get("zona", tarea["grupo"]))
+        esperados = g["descargadas"] + g["pendientes"] + g["verificando"] * tasa
+        return esperados < g["cuota"]
+
+    def _siguiente_reserva(self, g):
+        # Debe llamarse con el lock tomado. Un punto verificado sin cobertura
+        # deja al grupo corto: el mismo worker sigue con un candidato en
+        # reserva en vez de esperar un lote nuevo.
+        if (
+            g["reserva"]
+            and not self.detenido
+            and self._necesita_candidatos(g)
+            and self._necesita_verificar(g["reserva"][-1], g)
+        ):
+            g["intentos"] += 1
+            g["verificando"] += 1
+            return g["reserva"].pop()
+        return None
+
+    def _registrar_etapa(self, etapa, inicio, exito):
+        with self._lock:
+            e = self.etapas[etapa]
+            e["procesados"] += 1
+            e["exitos" if exito else "fallos"] += 1
+            e["segundos"] += time.monotonic() - inicio
+
+    def _worker_metadata(self):
+        while True:
+            tarea = self.cola_candidatos.get()
+            if tarea is _FIN:
+                return
+
+            grupo = tarea["grupo"]
+            with self._lock:
+                g = self.grupos[grupo]
+                g["en_cola"] -= 1
+                if self.detenido or not self._necesita_candidatos(g):
+                    g["descartadas"] += 1
+                    METRICAS.contar("ubicaciones_total", resultado="descartada")
+                    continue
+                # Un respaldo devuelto (ver _escritura_terminada) va antes
+                # que pagar otra consulta de metadata.
+                respaldo = self._recuperar_respaldo(g)
+                verificar = respaldo is None and self._necesita_verificar(tarea, g)
+                if verificar:
+                    g["intentos"] += 1
+                    g["verificando"] += 1
+                else:
+                    g["reserva"].append(tarea)
+
+            if respaldo is not None:
+                self.cola_imagenes.put(respaldo)
+                self._guardar_cupo()
+            if not verificar:
+                continue
+
+            while tarea is not None:
+                try:
+                    self._verificar(tarea, g)
+                finally:
+                    with self._lock:
+                        g["verificando"] -= 1
+                        tarea = self._siguiente_reserva(g)
+                    self._guardar_cupo()
+
+    def _verificar(self, tarea, g):
+        grupo = tarea["grupo"]
+        if self.registro is not None and self._buscar_existente(tarea, g):
+            return
+
+        inicio = time.monotonic()
+        try:
+            panorama = self.cliente.panorama(tarea["lat"], tarea["lon"])
+            hay_cobertura = panorama is not None
+        except ErrorStreetView as e:
+            hay_cobertura = None
+            debug(f"  [{grupo}] ❌ Error de metadata: {e}")
+        self._registrar_etapa("metadata", inicio, hay_cobertura is not None)
+
+        if self.estimador is not None and hay_cobertura is not None:
+            self.estimador.registrar(tarea.get("zona", grupo), hay_cobertura)
+
+        if not hay_cobertura:
+            if hay_cobertura is False:
+                METRICAS.contar("ubicaciones_total", resultado="sin_cobertura")
+                debug(f"  [{grupo}] ❌ No hay Street View")
+            else:
+                METRICAS.contar("ubicaciones_total", resultado="error")
+            with self._lock:
+                g["saltadas"] += 1
+            return
+
+        # Antes de pasar a respaldo: todas las vistas de un punto, aunque
+        # se recupere más tarde, salen del panorama verificado.
+        tarea["pano_id"] = panorama.get("pano_id")
+
+        # La imagen es la llamada con costo: se reserva cupo antes de
+        # encolarla para nunca pasarse de la cuota del grupo.
+        with self._lock:
+            if self._grupo_completo(g):
+                # Verificado mientras otro punto ocupaba el último cupo: la
+                # llamada ya se pagó, así que se guarda por si ese falla.
+                if g["pendientes"] > 0 and len(g["respaldo"]) < RESPALDO_POR_GRUPO:
+                    g["respaldo"].append(tarea)
+                else:
+                    g["descartadas"] += 1
+                    METRICAS.contar("ubicaciones_total", resultado="descartada")
+                return
+
+            # Presupuesto agotado: el punto verificado se descarta y el
+            # resto de la cola se drena sin más llamadas.
+            if not self._reservar():
+                g["descartadas"] += 1
+                METRICAS.contar("ubicaciones_total", resultado="descartada")
+                return
+            g["pendientes"] += 1
+
+        self.cola_imagenes.put(tarea)
+
+    def _buscar_existente(self, tarea, g):
+        # Un punto ya capturado (en esta u otra campaña) no vuelve a pedirse:
+        # si la captura es de este mismo trabajo se omite, si es de otro se
+        # reutiliza su archivo sin llamar a la API.
+        cercanas = self.registro.cercanas(tarea["lat"], tarea["lon"])
+        if not cercanas:
+            return False
+
+        grupo = tarea["grupo"]
+        reutilizables = [
+            c for c in cercanas if len(c["vistas"]) == len(self.headings)
+        ]
+        with self._lock:
+            if any(c["origen"] == tarea.get("origen") for c in cercanas):
+                g["descartadas"] += 1
+                METRICAS.contar("ubicaciones_total", resultado="duplicada")
+                debug(f"  [{grupo}] ⏭️  Ya capturada en este trabajo")
+                return True
+            if not reutilizables:
+                return False
+            if self._grupo_completo(g):
+                g["descartadas"] += 1
+                METRICAS.contar("ubicaciones_total", resultado="descartada")
+                return True
+            g["pendientes"] += 1
+
+        tarea["reutilizar"] = reutilizables[0]
+        tarea["pano_id"] = reutilizables[0]["pano_id"]
+        self.cola_imagenes.put(tarea)
+        return True
+
+    def _worker_imagen(self):
+        while True:
+            tarea = self.cola_imagenes.get()
+            if tarea is _FIN:
+                return
+
+            while tarea is not None:
+                tarea = self._procesar_imagen(tarea)
+                self._guardar_cupo()
+
+    def _descargar_vista(self, tarea, heading):
+        return heading, self.cliente.imagen(
+            tarea["lat"], tarea["lon"], heading=heading, pano=tarea.get("pano_id")
+        )
+
+    def _descargar_vistas(self, tarea):
+        # Todas o ninguna: una ubicación con vistas incompletas no se guarda
+        # y su cupo pasa a un punto de respaldo. Aun así se espera a todas las
+        # vistas pedidas: las que llegaron ya se cobraron.
+        futuros = [
+            self._executor_vistas.submit(self._descargar_vista, tarea, heading)
+            for heading in self.headings[1:]
+        ]
+        vistas = []
+        error = None
+        try:
+            vistas.append(self._descargar_vista(tarea, self.headings[0]))
+        except ErrorStreetView as e:
+            error = e
+        for futuro in futuros:
+            try:
+                vistas.append(futuro.result())
+            except ErrorStreetView as e:
+                error = error or e
+        return vistas, error
+
+    def _procesar_imagen(self, tarea):
+        grupo = tarea["grupo"]
+        reutilizada = "reutilizar" in tarea
+        cobradas = 0
+        if reutilizada:
+            try:
+                vistas = self.registro.leer(tarea["reutilizar"])
+                if vistas is None:
+                    debug(f"  [{grupo}] ⏳ Captura previa aún no disponible")
+            except (OSError, KeyError, ValueError) as e:
+                vistas = None
+                debug(f"  [{grupo}] ❌ No se pudo reutilizar la captura: {e}")
+            if vistas is None:
+                METRICAS.contar("ubicaciones_total", resultado="error")
+        else:
+            inicio = time.monotonic()
+            vistas, error = self._descargar_vistas(tarea)
+            cobradas = len(vistas)
+            if error is not None:
+                vistas = None
+                METRICAS.contar("ubicaciones_total", resultado="error")
+                debug(f"  [{grupo}] ❌ Error al descargar: {error}")
+            self._registrar_etapa("imagen", inicio, vistas is not None)
+
+        with self._lock:
+            g = self.grupos[grupo]
+            if vistas is None:
+                g["pendientes"] -= 1
+                # Solo vuelve al presupuesto lo que no se llegó a cobrar
+                if self.guardia is not None and not reutilizada:
+                    self.guardia.liberar(len(self.headings) - cobradas)
+                return self._tomar_respaldo(g)
+            g["numerados"] += 1
+            numero = g["numerados"]
+
+        # La imagen sigue pendiente hasta que está escrita: recién entonces
+        # cuenta como descargada y entra a metadata.
+        try:
+            resultado = self.guardar(tarea, vistas, numero)
+        except Exception as e:
+            return self._guardado_fallido(tarea, g, e)
+
+        if isinstance(resultado, Future):
+            with self._lock:
+                self._escrituras.add(resultado)
+            resultado.add_done_callback(partial(self._escritura_terminada, tarea, g))
+            return None
+
+        self._confirmar(tarea, g, resultado)
+        return None
+
+    def _escritura_terminada(self, tarea, g, futuro):
+        try:
+            registro = futuro.result()
+        except Exception as e:
+            # Corre en un thread del procesador: put() bloqueante con la cola
+            # llena puede trabarse con los workers de imagen esperando a ese
+            # mismo procesador. Si no entra, el respaldo vuelve al grupo.
+            respaldo = self._guardado_fallido(tarea, g, e)
+            if respaldo is not None:
+                try:
+                    self.cola_imagenes.put_nowait(respaldo)
+                except queue.Full:
+                    self._devolver_respaldo(g, respaldo)
+        else:
+            self._confirmar(tarea, g, registro)
+        finally:
+            with self._lock:
+                self._escrituras.discard(futuro)
+                self._escrituras_cond.notify_all()
+            self._guardar_cupo()
+
+    def _guardado_fallido(self, tarea, g, error):
+        METRICAS.contar("ubicaciones_total", resultado="error")
+        debug(f"  [{tarea['grupo']}] ❌ Error al guardar: {error}")
+        with self._lock:
+            g["pendientes"] -= 1
+            # Con las colas ya cerradas no hay quien procese un respaldo
+            if self._cerrando:
+                g["saltadas"] += 1
+                return None
+            return self._tomar_respaldo(g)
+
+    def _confirmar(self, tarea, g, registro):
+        reutilizada = "reutilizar" in tarea
+        with self._lock:
+            g["pendientes"] -= 1
+            g["descargadas"] += 1
+            if reutilizada:
+                g["reutilizadas"] += 1
+            if registro is not None:
+                self.metadata.append(registro)
+
+            if g["pendientes"] == 0:
+                g["descartadas"] += len(g["respaldo"])
+                METRICAS.contar(
+                    "ubicaciones_total", len(g["respaldo"]), resultado="descartada"
+                )
+                g["respaldo"].clear()
+
+        if registro is not None:
+            debug(f"  [{tarea['grupo']}] ✅ {registro['filename']}")
+        METRICAS.contar(
+            "ubicaciones_total", resultado="reutilizada" if reutilizada else "descargada"
+        )
+
+    def _recuperar_respaldo(self, g):
+        # Debe llamarse con el lock tomado
+        if g["respaldo"] and not self._grupo_completo(g) and self._reservar():
+            g["pendientes"] += 1
+            return g["respaldo"].pop()
+        return None
+
+    def _devolver_respaldo(self, g, respaldo):
+        # Deshace _recuperar_respaldo: el próximo candidato del grupo que
+        # llegue a la etapa de metadata lo vuelve a tomar.
+        with self._lock:
+            g["pendientes"] -= 1
+            g["respaldo"].append(respaldo)
+            if self.guardia is not None:
+                self.guardia.liberar(len(self.headings))
+
+    def _tomar_respaldo(self, g):
+        # Debe llamarse con el lock tomado. Una imagen fallida libera su cupo:
+        # se reutiliza un punto ya verificado en vez de perderlo.
+        g["saltadas"] += 1
+        respaldo = self._recuperar_respaldo(g)
+        if respaldo is not None:
+            return respaldo
+
+        # Sin respaldo verificado, un candidato en reserva vuelve a la etapa
+        # de metadata (sin bloquear: si la cola está llena, ya hay trabajo en
+        # vuelo que la revisará al terminar).
+        if g["reserva"] and not g["verificando"] and not self._sin_metadata:
+            try:
+                self.cola_candidatos.put_nowait(g["reserva"][-1])
+            except queue.Full:
+                return None
+            g["reserva"].pop()
+            g["en_cola"] += 1
+        return None
+
+    def resumen_etapas(self):
+        transcurrido = max(time.monotonic() - self._inicio, 1e-9)
+        with self._lock:
+            return {
+                etapa: dict(
+                    e,
+                    por_segundo=e["procesados"] / transcurrido,
+                    latencia_media=e["segundos"] / e["procesados"]
+                    if e["procesados"]
+                    else 0.0,
+                )
+                for etapa, e in self.etapas.items()
+            }
+
+    def cerrar(self):
+        with self._lock:
+            self._sin_metadata = True
+        for _ in self._threads_metadata:
+            self.cola_candidatos.put(_FIN)
+        for t in self._threads_metadata:
+            t.join()
+
+        # Una escritura fallida puede devolver un respaldo a la cola de
+        # imágenes: hay que esperarlas antes de cerrarla, y otra vez después
+        # para las que lanzaron los últimos puntos de la cola.
+        with self._lock:
+            while self._escrituras:
+                self._escrituras_cond.wait()
+            self._cerrando = True
+
+        for _ in self._threads_imagen:
+            self.cola_imagenes.put(_FIN)
+        for t in self._threads_imagen:
+            t.join()
+
+        with self._lock:
+            while self._escrituras:
+                self._escrituras_cond.wait()
+
+        if self._executor_vistas is not None:
+            self._executor_vistas.shutdown(wait=True)
+
+        for g in self.grupos.values():
+            sobrantes = len(g.pop("respaldo")) + len(g.pop("reserva"))
+            g["descartadas"] += sobrantes
+            METRICAS.contar("ubicaciones_total", sobrantes, resultado="descartada")
+
+        print(f"\n⚙️  Pipeline ({time.monotonic() - self._inicio:.1f}s):")
+        for etapa, e in self.resumen_etapas().items():
+            print(
+                f"   {etapa:9s}: {e['procesados']:5d} llamadas / {e['exitos']:5d} ok / "
+                f"{e['fallos']:4d} fallos / {e['por_segundo']:.1f} llamadas/s / "
+                f"{e['latencia_media']:.2f}s latencia media"
+            )
+        print()
+
+        return self.grupos
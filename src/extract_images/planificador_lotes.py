@@ -0,0 +1,126 @@
+import math
+import threading
+from collections import deque
+from itertools import islice
+
+TAMANO_LOTE = 25
+LOTE_MAXIMO = 200
+ESPERA_GRUPO_PENDIENTE = 0.2
+
+
+class PlanificadorLotes:
+    def __init__(self, pipeline, tamano_lote=TAMANO_LOTE, estimador=None):
+        self.pipeline = pipeline
+        self.tamano_lote = tamano_lote
+        self.estimador = estimador
+        self.lotes_enviados = {}
+        self.agotados = []
+
+        self._trabajos = deque()
+        self._cond = threading.Condition()
+        self._cerrado = False
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(
+            target=self._despachar, name="planificador", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def agregar(self, grupo, tareas, cuota=None, zona=None):
+        if cuota is not None:
+            self.pipeline.definir_cuota(grupo, cuota)
+
+        with self._cond:
+            self._trabajos.append((grupo, zona, iter(tareas)))
+            self.lotes_enviados.setdefault(grupo, 0)
+            self._cond.notify()
+
+    def _siguiente_trabajo(self):
+        with self._cond:
+            while not self._trabajos and not self._cerrado:
+                self._cond.wait()
+            if not self._trabajos:
+                return None
+            return self._trabajos.popleft()
+
+    def _reencolar(self, trabajo):
+        with self._cond:
+            self._trabajos.append(trabajo)
+
+    def _tamano_lote(self, grupo, zona):
+        # en_vuelo: candidatos en cola o verificándose en la etapa de metadata
+        faltantes, en_vuelo = self.pipeline.demanda(grupo)
+        if faltantes is None or self.estimador is None or zona is None:
+            return self.tamano_lote
+
+        # Zonas con poca cobertura reciben lotes más grandes en cada turno,
+        # pero nunca más candidatos de los que se espera necesitar.
+        tasa = self.estimador.tasa(zona)
+        por_turno = min(LOTE_MAXIMO, math.ceil(self.tamano_lote / tasa))
+        necesarios = self.estimador.candidatos_necesarios(zona, faltantes)
+        return max(0, min(por_turno, necesarios - en_vuelo))
+
+    def _despachar(self):
+        # Round-robin de lotes pequeños entre todos los trabajos activos: los
+        # workers del pipeline avanzan sobre todos los distritos a la vez y un
+        # distrito rezagado no se queda con la cola entera al final.
+        sin_progreso = 0
+
+        while True:
+            trabajo = self._siguiente_trabajo()
+            if trabajo is None:
+                return
+
+            grupo, zona, tareas = trabajo
+
+            # Presupuesto o cuota diaria agotados: no se planifica nada más
+            if self.pipeline.detenido:
+                return
+
+            if self.pipeline.grupo_cumplido(grupo):
+                continue
+
+            n = self._tamano_lote(grupo, zona)
+            if n == 0 or not self.pipeline.necesita_candidatos(grupo):
+                # Cupo reservado o candidatos suficientes en vuelo: se vuelve
+                # a evaluar más tarde por si alguna verificación o imagen falla.
+                self._reencolar(trabajo)
+                sin_progreso += 1
+                with self._cond:
+                    if sin_progreso >= len(self._trabajos):
+                        self._cond.wait(ESPERA_GRUPO_PENDIENTE)
+                        sin_progreso = 0
+                continue
+
+            sin_progreso = 0
+
+            # Los candidatos salen de generadores perezosos (red vial,
+            # muestreo): si uno falla, solo esa zona se da por agotada.
+            lote = []
+            fallo = False
+            try:
+                lote.extend(islice(tareas, n))
+            except Exception as e:
+                print(f"⚠️  Error generando candidatos de {zona or grupo}: {e}")
+                fallo = True
+
+            for tarea in lote:
+                self.pipeline.enviar(tarea)
+
+            if lote:
+                with self._cond:
+                    self.lotes_enviados[grupo] += 1
+
+            if len(lote) == n and not fallo:
+                self._reencolar(trabajo)
+            else:
+                with self._cond:
+                    self.agotados.append(grupo)
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import tempfile
+import threading
+from datetime import date
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.extract_images.cliente_street_view import (
+    CONCURRENCIA_MAXIMA,
+    COSTO_POR_IMAGEN,
+    QPS_MAXIMO,
+)
+from src.extract_images.metricas import METRICAS
+from src.extract_images.muestreo_adaptativo import MARGEN_SOBREMUESTREO
+
+load_dotenv()
+
+# Sin valor = sin límite
+PRESUPUESTO_USD = os.getenv("PRESUPUESTO_USD")
+CUOTA_DIARIA = os.getenv("CUOTA_DIARIA_IMAGENES")
+ARCHIVO_CUOTA = os.getenv("ARCHIVO_CUOTA", "cuota_street_view.json")
+
+LATENCIA_ESTIMADA = 0.3
+GUARDAR_CADA = 100
+
+
+def estimar(zonas, estimador, vistas=1, qps=QPS_MAXIMO):
+    # zonas: [(zona, cuota)]. La cobertura histórica de cada zona da cuántas
+    # consultas de metadata hacen falta para llegar a su cuota.
+    llamadas_metadata = 0
+    imagenes = 0
+
+    for zona, cuota in zonas:
+        llamadas_metadata += math.ceil(
+            cuota * MARGEN_SOBREMUESTREO / estimador.tasa(zona)
+        )
+        imagenes += cuota * vistas
+
+    llamadas = llamadas_metadata + imagenes
+    ritmo = min(qps, CONCURRENCIA_MAXIMA / LATENCIA_ESTIMADA)
+
+    return {
+        "zonas": len(zonas),
+        "llamadas_metadata": llamadas_metadata,
+        "llamadas_imagen": imagenes,
+        "costo_usd": round(imagenes * COSTO_POR_IMAGEN, 2),
+        "segundos": round(llamadas / ritmo, 1),
+    }
+
+
+def mostrar_plan(planes, presupuesto=None, cuota_diaria=None):
+    print("\n" + "=" * 70)
+    print("🧮 PLAN DE COSTO Y CUOTA (antes de empezar)")
+    print("=" * 70)
+
+    total_costo = 0.0
+    total_imagenes = 0
+    for nombre, plan in planes.items():
+        total_costo += plan["costo_usd"]
+        total_imagenes += plan["llamadas_imagen"]
+        print(
+            f"  {nombre:15s}: {plan['zonas']:4d} zonas / "
+            f"{plan['llamadas_metadata']:7d} metadata / "
+            f"{plan['llamadas_imagen']:7d} imágenes / "
+            f"${plan['costo_usd']:8.2f} / ~{plan['segundos'] / 60:.1f} min"
+        )
+
+    print(f"\n  💰 Costo estimado total: ${total_costo:.2f} USD")
+    if presupuesto is not None and total_costo > presupuesto:
+        print(
+            f"  ⚠️  Supera el presupuesto de ${presupuesto:.2f}: "
+            f"la corrida se detendrá antes"
+        )
+    if cuota_diaria is not None and total_imagenes > cuota_diaria:
+        print(f"  ⚠️  Supera la cuota diaria de {cuota_diaria} imágenes")
+    print("=" * 70 + "\n")
+
+
+class GuardiaPresupuesto:
+    def __init__(
+        self,
+        presupuesto_usd=PRESUPUESTO_USD,
+        cuota_diaria=CUOTA_DIARIA,
+        archivo=ARCHIVO_CUOTA,
+        costo_por_imagen=COSTO_POR_IMAGEN,
+    ):
+        self.presupuesto = float(presupuesto_usd) if presupuesto_usd else None
+        self.cuota_diaria = int(cuota_diaria) if cuota_diaria else None
+        self.archivo = Path(archivo)
+        self.costo_por_imagen = costo_por_imagen
+
+        self.reservadas = 0
+        self.agotado = False
+        self.motivo = None
+
+        self._lock = threading.Lock()
+        self._hoy = date.today().isoformat()
+        self._uso = {}
+        self._sin_guardar = 0
+
+        if self.archivo.exists():
+            try:
+                with open(self.archivo, "r", encoding="utf-8") as f:
+                    self._uso = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No se pudo leer {self.archivo}: {e}")
+
+        METRICAS.gauge("presupuesto_reservado_usd", lambda: self.gastado)
+
+    @property
+    def gastado(self):
+        return self.reservadas * self.costo_por_imagen
+
+    def reservar(self, imagenes):
+        reservado, guardar = self.apartar(imagenes)
+        if guardar:
+            self.guardar()
+        return reservado
+
+    def apartar(self, imagenes):
+        # Se reserva antes de pedir las imágenes, así ningún worker puede
+        # pasarse del límite aunque muchos pidan a la vez. No toca el disco:
+        # devuelve (reservado, guardar) y quien llama guarda sin locks.
+        with self._lock:
+            if self.agotado:
+                return False, False
+
+            self._hoy = date.today().isoformat()
+
+            if self.presupuesto is not None:
+                costo = (self.reservadas + imagenes) * self.costo_por_imagen
+                if costo > self.presupuesto + 1e-9:
+                    motivo = f"presupuesto de ${self.presupuesto:.2f}"
+                    return self._agotar(motivo), False
+
+            usadas_hoy = self._uso.get(self._hoy, 0)
+            cuota = self.cuota_diaria
+            if cuota is not None and usadas_hoy + imagenes > cuota:
+                motivo = f"cuota diaria de {self.cuota_diaria} imágenes"
+                return self._agotar(motivo), False
+
+            self.reservadas += imagenes
+            self._uso[self._hoy] = usadas_hoy + imagenes
+            self._sin_guardar += imagenes
+            guardar = self._sin_guardar >= GUARDAR_CADA
+            if guardar:
+                self._sin_guardar = 0
+            return True, guardar
+
+    def liberar(self, imagenes):
+        # Imagen que no se llegó a descargar: no se cobra
+        with self._lock:
+            self.reservadas -= imagenes
+            self._uso[self._hoy] = max(0, self._uso.get(self._hoy, 0) - imagenes)
+
+    def _agotar(self, motivo):
+        # Debe llamarse con el lock tomado
+        self.agotado = True
+        self.motivo = motivo
+        print(
+            f"\n🛑 Límite alcanzado ({motivo}): "
+            f"se terminan las descargas en curso y se detiene",
+            flush=True,
+        )
+        return False
+
+    def guardar(self):
+        with self._lock:
+            contenido = json.dumps(self._uso, indent=2)
+            self._sin_guardar = 0
+
+        # Archivo temporal propio: dos guardados a la vez no se pisan
+        fd, tmp = tempfile.mkstemp(dir=self.archivo.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(contenido)
+        os.replace(tmp, self.archivo)
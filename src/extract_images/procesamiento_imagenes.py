@@ -0,0 +1,129 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+WORKERS_PROCESAMIENTO = int(os.getenv("WORKERS_PROCESAMIENTO", str(os.cpu_count() or 2)))
+
+CARPETA_ORIGINALES = "originales"
+TAMANO_REDUCIDO = 256
+CALIDAD_JPEG = 90
+
+
+def reducir_imagen(contenido, tamano=TAMANO_REDUCIDO, calidad=CALIDAD_JPEG):
+    img = Image.open(io.BytesIO(contenido))
+    ancho, alto = img.size
+
+    escala = tamano / min(ancho, alto)
+    destino = (max(1, round(ancho * escala)), max(1, round(alto * escala)))
+
+    # draft() deja que el decodificador JPEG reduzca por potencias de 2 al
+    # decodificar, así el resize trabaja sobre muchos menos píxeles.
+    img.draft("RGB", destino)
+    img = img.convert("RGB")
+    if escala < 1:
+        img = img.resize(destino, Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=calidad, optimize=True)
+
+    transformacion = {
+        "original": f"{ancho}x{alto}",
+        "tamano": f"{img.width}x{img.height}",
+        "calidad": calidad,
+        "bytes_original": len(contenido),
+        "bytes": buffer.tell(),
+    }
+    return buffer.getvalue(), transformacion
+
+
+class ProcesadorImagenes:
+    def __init__(
+        self,
+        escritor,
+        tamano=TAMANO_REDUCIDO,
+        calidad=CALIDAD_JPEG,
+        escritor_originales=None,
+        workers=WORKERS_PROCESAMIENTO,
+    ):
+        self.escritor = escritor
+        self.escritor_originales = escritor_originales
+        self.tamano = tamano
+        self.calidad = calidad
+        self.stats = {"procesadas": 0, "fallos": 0, "bytes_original": 0, "bytes": 0}
+
+        # Pillow suelta el GIL al decodificar, redimensionar y codificar, así
+        # que un pool de threads basta para sacar este trabajo de los threads
+        # de red. El semáforo evita acumular imágenes si el pool se atrasa.
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="procesamiento"
+        )
+        self._cupos = threading.BoundedSemaphore(workers * 4)
+        self._lock = threading.Lock()
+
+    def guardar(self, ruta, contenido, metadata=None):
+        # El Future termina cuando la imagen está escrita (o con su error)
+        self._cupos.acquire()
+        try:
+            return self._executor.submit(self._procesar, ruta, contenido, metadata)
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def _procesar(self, ruta, contenido, metadata):
+        try:
+            # Una captura reutilizada ya pasó por aquí en su campaña original
+            if getattr(contenido, "ruta_existente", None) is not None:
+                self.escritor.guardar(ruta, contenido, metadata)
+                return
+
+            try:
+                reducida, transformacion = reducir_imagen(
+                    contenido, self.tamano, self.calidad
+                )
+            except Exception as e:
+                print(f"  ⚠️  No se pudo reducir {ruta}, se guarda el original: {e}")
+                with self._lock:
+                    self.stats["fallos"] += 1
+                self.escritor.guardar(ruta, contenido, metadata)
+                return
+
+            if self.escritor_originales is not None:
+                transformacion["original_filename"] = (
+                    Path(CARPETA_ORIGINALES) / ruta
+                ).as_posix()
+                self.escritor_originales.guardar(ruta, contenido, metadata)
+
+            # El registro es el mismo dict que termina en metadata.json: se
+            # completa aquí y cerrar() espera a que todos estén escritos.
+            if metadata is not None:
+                metadata["transformacion"] = transformacion
+            self.escritor.guardar(ruta, reducida, metadata)
+
+            with self._lock:
+                self.stats["procesadas"] += 1
+                self.stats["bytes_original"] += transformacion["bytes_original"]
+                self.stats["bytes"] += transformacion["bytes"]
+        finally:
+            self._cupos.release()
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+        self.escritor.cerrar()
+        if self.escritor_originales is not None:
+            self.escritor_originales.cerrar()
+
+        s = self.stats
+        if s["procesadas"]:
+            ahorro = 1 - s["bytes"] / max(s["bytes_original"], 1)
+            print(
+                f"\n🖼️  Procesamiento: {s['procesadas']} imágenes reducidas a "
+                f"{self.tamano}px ({s['bytes_original'] / 1e6:.1f} MB → "
+                f"{s['bytes'] / 1e6:.1f} MB, {ahorro:.0%} menos), {s['fallos']} fallos"
+            )
@@ -0,0 +1,254 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVO_REGISTRO = os.getenv("ARCHIVO_REGISTRO", "registro_ubicaciones.sqlite")
+RADIO_DUPLICADO_M = float(os.getenv("RADIO_DUPLICADO_M", "15"))
+
+METROS_POR_GRADO = 111_320
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+CONFIRMAR_CADA = 100
+
+
+def geohash(lat, lon, precision):
+    lat_rango = [-90.0, 90.0]
+    lon_rango = [-180.0, 180.0]
+    bits = 0
+    n_bits = 0
+    par = True
+    resultado = []
+
+    while len(resultado) < precision:
+        rango, valor = (lon_rango, lon) if par else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        bits <<= 1
+        if valor >= medio:
+            bits |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        n_bits += 1
+
+        if n_bits == 5:
+            resultado.append(BASE32[bits])
+            bits = 0
+            n_bits = 0
+
+    return "".join(resultado)
+
+
+def tamano_celda(precision):
+    # Alto y ancho (en grados) de una celda geohash de esa precisión
+    bits_lon = math.ceil(precision * 5 / 2)
+    bits_lat = math.floor(precision * 5 / 2)
+    return 180.0 / 2**bits_lat, 360.0 / 2**bits_lon
+
+
+def precision_para_radio(radio_m, lat=0.0):
+    # La mayor precisión cuya celda sigue siendo al menos tan grande como el
+    # radio: así basta mirar la celda y sus 8 vecinas.
+    for precision in range(12, 0, -1):
+        alto, ancho = tamano_celda(precision)
+        ancho_m = ancho * METROS_POR_GRADO * math.cos(math.radians(lat))
+        if min(alto * METROS_POR_GRADO, ancho_m) >= radio_m:
+            return precision
+    return 1
+
+
+def distancia_m(lat1, lon1, lat2, lon2):
+    dy = (lat2 - lat1) * METROS_POR_GRADO
+    dx = (lon2 - lon1) * METROS_POR_GRADO * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy)
+
+
+class ContenidoExistente(bytes):
+    # Bytes de una captura previa que recuerdan de qué archivo salieron, para
+    # que el escritor pueda enlazarlo en vez de duplicarlo en disco.
+    ruta_existente = None
+
+
+class RegistroUbicaciones:
+    def __init__(self, archivo=ARCHIVO_REGISTRO, radio_m=RADIO_DUPLICADO_M):
+        self.archivo = Path(archivo)
+        self.radio_m = radio_m
+        # Lima está a ~12°S; el ancho de celda apenas cambia en Perú
+        self.precision = precision_para_radio(radio_m, lat=-12.0)
+
+        self._lock = threading.Lock()
+        self._celdas = {}
+        self._pendientes = 0
+        self._indices_shards = {}
+
+        self._conexion = sqlite3.connect(self.archivo, check_same_thread=False)
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS capturas (
+                geohash TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                origen TEXT NOT NULL,
+                trabajo TEXT,
+                vistas TEXT NOT NULL,
+                pano_id TEXT,
+                timestamp REAL
+            )
+            """
+        )
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS capturas_geohash ON capturas (geohash)"
+        )
+        self._conexion.commit()
+
+        # El índice en memoria se arma con el prefijo de la precisión actual,
+        # así un cambio de radio no obliga a reescribir la base.
+        filas = self._conexion.execute(
+            "SELECT lat, lon, origen, trabajo, vistas, pano_id FROM capturas"
+        )
+        for lat, lon, origen, trabajo, vistas, pano_id in filas:
+            self._indexar(
+                {
+                    "lat": lat,
+                    "lon": lon,
+                    "origen": origen,
+                    "trabajo": trabajo,
+                    "vistas": json.loads(vistas),
+                    "pano_id": pano_id,
+                }
+            )
+
+        print(
+            f"🗂️  Registro de ubicaciones: {self.total} capturas previas "
+            f"(radio {radio_m:.0f} m, geohash {self.precision})"
+        )
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(len(c) for c in self._celdas.values())
+
+    def _indexar(self, captura):
+        celda = geohash(captura["lat"], captura["lon"], self.precision)
+        self._celdas.setdefault(celda, []).append(captura)
+
+    def cercanas(self, lat, lon):
+        alto, ancho = tamano_celda(self.precision)
+        celdas = {
+            geohash(lat + i * alto, lon + j * ancho, self.precision)
+            for i in (-1, 0, 1)
+            for j in (-1, 0, 1)
+        }
+
+        with self._lock:
+            candidatas = [c for celda in celdas for c in self._celdas.get(celda, ())]
+
+        return [
+            c
+            for c in candidatas
+            if distancia_m(lat, lon, c["lat"], c["lon"]) <= self.radio_m
+        ]
+
+    def registrar(self, lat, lon, origen, trabajo, vistas, pano_id=None):
+        captura = {
+            "lat": lat,
+            "lon": lon,
+            "origen": str(origen),
+            "trabajo": trabajo,
+            "vistas": vistas,
+            "pano_id": pano_id,
+        }
+
+        with self._lock:
+            self._indexar(captura)
+            self._conexion.execute(
+                "INSERT INTO capturas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    geohash(lat, lon, 12),
+                    lat,
+                    lon,
+                    captura["origen"],
+                    trabajo,
+                    json.dumps(vistas),
+                    pano_id,
+                    time.time(),
+                ),
+            )
+            self._pendientes += 1
+            if self._pendientes >= CONFIRMAR_CADA:
+                self._conexion.commit()
+                self._pendientes = 0
+
+    def leer(self, captura):
+        # Devuelve [(heading, bytes)] de una captura previa, desde carpetas o
+        # desde los shards del trabajo que la descargó. None si alguna vista
+        # todavía no se puede leer (p. ej. su shard sigue abierto).
+        origen = Path(captura["origen"])
+        vistas = []
+
+        for vista in captura["vistas"]:
+            ruta = origen / vista["filename"]
+            if ruta.exists():
+                contenido = ContenidoExistente(ruta.read_bytes())
+                contenido.ruta_existente = ruta
+            else:
+                contenido = self._leer_de_shards(origen, vista["filename"])
+                if contenido is None:
+                    return None
+            vistas.append((vista["heading"], contenido))
+
+        return vistas
+
+    def _leer_de_shards(self, origen, filename):
+        from src.extract_images.salida_imagenes import leer_muestra
+
+        directorio = origen / "shards"
+        entrada = self._indice_shards(directorio).get(filename)
+        if entrada is None:
+            return None
+        contenido, _ = leer_muestra(directorio, entrada)
+        return contenido
+
+    def _indice_shards(self, directorio):
+        # shards.json crece mientras el otro trabajo sigue escribiendo: solo
+        # se vuelve a mirar si cambió, y solo se leen los índices de los
+        # shards nuevos (los cerrados no cambian). La lectura va sin el lock.
+        from src.extract_images.salida_imagenes import asignar_shards, leer_indice
+
+        try:
+            mtime = (directorio / "shards.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+
+        with self._lock:
+            previo = self._indices_shards.get(directorio)
+        if previo is not None and previo[0] == mtime:
+            return previo[2]
+
+        leidos, indice = (set(), {}) if previo is None else (previo[1], previo[2])
+        # (nombre, bytes): un shard reescrito por otra corrida cuenta como nuevo
+        nuevos = [
+            s
+            for s in asignar_shards(directorio)
+            if (s["shard"], s["bytes"]) not in leidos
+        ]
+        indice = dict(indice)
+        for e in leer_indice(directorio, nuevos):
+            indice[f"{e['clave']}.{e['extension']}"] = e
+        leidos = leidos | {(s["shard"], s["bytes"]) for s in nuevos}
+
+        with self._lock:
+            self._indices_shards[directorio] = (mtime, leidos, indice)
+        return indice
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.commit()
+            self._conexion.close()
@@ -0,0 +1,313 @@
+import argparse
+import io
+import json
+import os
+import random
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.extract_images.metricas import METRICAS
+
+load_dotenv()
+
+FORMATO_SALIDA = os.getenv("FORMATO_SALIDA", "carpetas")
+TAMANO_SHARD = int(os.getenv("TAMANO_SHARD_MB", "256")) * 1024 * 1024
+
+# Lado menor de la copia reducida (0 = se guarda la imagen tal cual llega).
+# 256 coincide con el Resize(256) que aplica el extractor de features.
+TAMANO_PROCESADO = int(os.getenv("TAMANO_PROCESADO", "0"))
+CALIDAD_PROCESADO = int(os.getenv("CALIDAD_PROCESADO", "90"))
+CONSERVAR_ORIGINAL = os.getenv("CONSERVAR_ORIGINAL", "0") == "1"
+
+EXTENSIONES_IMAGEN = {".jpg", ".jpeg", ".png"}
+
+
+class EscritorCarpetas:
+    def __init__(self, base_path):
+        self.base_path = Path(base_path)
+
+    def guardar(self, ruta, contenido, metadata=None):
+        destino = self.base_path / ruta
+        destino.parent.mkdir(parents=True, exist_ok=True)
+
+        # Captura reutilizada de otra campaña: un hard link evita duplicarla
+        existente = getattr(contenido, "ruta_existente", None)
+        if existente is not None:
+            try:
+                os.link(existente, destino)
+                return
+            except OSError:
+                pass
+
+        with open(destino, "wb") as f:
+            f.write(contenido)
+        METRICAS.contar("bytes_escritos_total", len(contenido))
+
+    def cerrar(self):
+        pass
+
+
+class EscritorShards:
+    def __init__(self, directorio, prefijo="shard", tamano_maximo=TAMANO_SHARD):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.prefijo = prefijo
+        self.tamano_maximo = tamano_maximo
+        self.shards = []
+
+        self._lock = threading.Lock()
+        self._numero = 0
+        self._tar = None
+        self._indice = None
+        self._nombre = None
+        self._muestras = 0
+
+    def _abrir_siguiente(self):
+        self._cerrar_actual()
+
+        self._nombre = f"{self.prefijo}-{self._numero:05d}"
+        self._numero += 1
+        self._tar = tarfile.open(
+            self.directorio / f"{self._nombre}.tar", "w", format=tarfile.PAX_FORMAT
+        )
+        self._indice = open(
+            self.directorio / f"{self._nombre}.idx.jsonl", "w", encoding="utf-8"
+        )
+        self._muestras = 0
+
+    def _cerrar_actual(self):
+        if self._tar is None:
+            return
+
+        tamano = self._tar.offset
+        self._tar.close()
+        self._indice.close()
+        self.shards.append(
+            {
+                "shard": f"{self._nombre}.tar",
+                "indice": f"{self._nombre}.idx.jsonl",
+                "muestras": self._muestras,
+                "bytes": tamano,
+            }
+        )
+        self._tar = None
+        # La lista se reescribe en cada cambio de shard: si la corrida se
+        # corta, los shards ya cerrados siguen siendo legibles.
+        self._escribir_lista()
+
+    def _escribir_lista(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.shards, f, indent=2)
+        os.replace(tmp, self.directorio / "shards.json")
+
+    def _agregar_miembro(self, nombre, contenido, mtime):
+        info = tarfile.TarInfo(nombre)
+        info.size = len(contenido)
+        info.mtime = mtime
+
+        # Offset del contenido dentro del .tar: posición actual + cabecera(s)
+        cabecera = info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors)
+        offset = self._tar.offset + len(cabecera)
+        self._tar.addfile(info, io.BytesIO(contenido))
+        return offset
+
+    def guardar(self, ruta, contenido, metadata=None):
+        ruta = Path(ruta)
+        clave = ruta.with_suffix("").as_posix()
+        extension = ruta.suffix.lstrip(".") or "jpg"
+        contenido_json = json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")
+
+        with self._lock:
+            if self._tar is None or self._tar.offset >= self.tamano_maximo:
+                self._abrir_siguiente()
+
+            mtime = time.time()
+            offset = self._agregar_miembro(f"{clave}.{extension}", contenido, mtime)
+            offset_json = self._agregar_miembro(f"{clave}.json", contenido_json, mtime)
+
+            entrada = {
+                "clave": clave,
+                "shard": f"{self._nombre}.tar",
+                "extension": extension,
+                "offset": offset,
+                "tamano": len(contenido),
+                "offset_json": offset_json,
+                "tamano_json": len(contenido_json),
+            }
+            self._indice.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self._muestras += 1
+        METRICAS.contar("bytes_escritos_total", len(contenido) + len(contenido_json))
+
+    def cerrar(self):
+        with self._lock:
+            self._cerrar_actual()
+
+
+def _escritor_base(base_path, formato):
+    if formato == "shards":
+        return EscritorShards(Path(base_path) / "shards")
+    return EscritorCarpetas(base_path)
+
+
+def crear_escritor(
+    base_path,
+    formato=FORMATO_SALIDA,
+    tamano=TAMANO_PROCESADO,
+    calidad=CALIDAD_PROCESADO,
+    conservar_original=CONSERVAR_ORIGINAL,
+):
+    escritor = _escritor_base(base_path, formato)
+    if not tamano:
+        return escritor
+
+    from src.extract_images.procesamiento_imagenes import (
+        CARPETA_ORIGINALES,
+        ProcesadorImagenes,
+    )
+
+    originales = None
+    if conservar_original:
+        originales = _escritor_base(Path(base_path) / CARPETA_ORIGINALES, formato)
+    return ProcesadorImagenes(escritor, tamano, calidad, originales)
+
+
+def leer_indice(directorio, shards=None):
+    directorio = Path(directorio)
+    if shards is None:
+        shards = asignar_shards(directorio)
+
+    entradas = []
+    for shard in shards:
+        with open(directorio / shard["indice"], "r", encoding="utf-8") as f:
+            entradas.extend(json.loads(linea) for linea in f)
+    return entradas
+
+
+def leer_muestra(directorio, entrada):
+    with open(Path(directorio) / entrada["shard"], "rb") as f:
+        f.seek(entrada["offset"])
+        contenido = f.read(entrada["tamano"])
+        f.seek(entrada["offset_json"])
+        metadata = json.loads(f.read(entrada["tamano_json"]))
+    return contenido, metadata
+
+
+def asignar_shards(directorio, worker_id=0, num_workers=1):
+    with open(Path(directorio) / "shards.json", "r", encoding="utf-8") as f:
+        shards = json.load(f)
+    return shards[worker_id::num_workers]
+
+
+def _muestras_de_shard(ruta):
+    pendientes = {}
+
+    with open(ruta, "rb", buffering=1024 * 1024) as archivo:
+        with tarfile.open(fileobj=archivo, mode="r|") as tar:
+            for miembro in tar:
+                if not miembro.isfile():
+                    continue
+
+                clave, _, extension = miembro.name.rpartition(".")
+                contenido = tar.extractfile(miembro).read()
+
+                muestra = pendientes.setdefault(clave, {"clave": clave})
+                if extension == "json":
+                    muestra["metadata"] = json.loads(contenido)
+                else:
+                    muestra["imagen"] = contenido
+
+                if "imagen" in muestra and "metadata" in muestra:
+                    yield pendientes.pop(clave)
+
+
+def iterar_shards(directorio, shards=None, buffer_barajado=0, semilla=None):
+    directorio = Path(directorio)
+    if shards is None:
+        shards = asignar_shards(directorio)
+
+    rng = random.Random(semilla)
+    shards = list(shards)
+    if buffer_barajado > 1:
+        rng.shuffle(shards)
+
+    buffer = []
+    for shard in shards:
+        for muestra in _muestras_de_shard(directorio / shard["shard"]):
+            if buffer_barajado <= 1:
+                yield muestra
+                continue
+
+            # Buffer de barajado: la lectura sigue siendo secuencial, pero las
+            # muestras salen en orden aleatorio dentro de una ventana.
+            if len(buffer) < buffer_barajado:
+                buffer.append(muestra)
+                continue
+
+            i = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = muestra
+
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def empaquetar_carpeta(origen, destino, tamano_maximo=TAMANO_SHARD):
+    origen = Path(origen)
+
+    metadata_por_archivo = {}
+    archivo_metadata = origen / "metadata.json"
+    if archivo_metadata.exists():
+        with open(archivo_metadata, "r", encoding="utf-8") as f:
+            for registro in json.load(f):
+                metadata_por_archivo[registro["filename"]] = registro
+
+    escritor = EscritorShards(destino, tamano_maximo=tamano_maximo)
+    total = 0
+
+    for ruta in sorted(origen.rglob("*")):
+        if ruta.suffix.lower() not in EXTENSIONES_IMAGEN or not ruta.is_file():
+            continue
+
+        relativa = ruta.relative_to(origen)
+        metadata = metadata_por_archivo.get(relativa.as_posix())
+        if metadata is None:
+            metadata = {
+                "filename": relativa.as_posix(),
+                "categoria": relativa.parts[0] if len(relativa.parts) > 1 else None,
+            }
+
+        escritor.guardar(relativa, ruta.read_bytes(), metadata)
+        total += 1
+
+    escritor.cerrar()
+    return total, escritor.shards
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Empaqueta una carpeta de imágenes descargadas en shards .tar"
+    )
+    parser.add_argument("origen", help="Carpeta con subcarpetas por categoría")
+    parser.add_argument("destino", help="Carpeta donde se escriben los shards")
+    parser.add_argument("--tamano-mb", type=int, default=TAMANO_SHARD // (1024 * 1024))
+    args = parser.parse_args()
+
+    print(f"\n📦 Empaquetando {args.origen} → {args.destino}")
+    inicio = time.monotonic()
+    total, shards = empaquetar_carpeta(
+        args.origen, args.destino, tamano_maximo=args.tamano_mb * 1024 * 1024
+    )
+    print(
+        f"✅ {total} imágenes en {len(shards)} shards "
+        f"({time.monotonic() - inicio:.1f}s)\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
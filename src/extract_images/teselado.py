@@ -0,0 +1,226 @@
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.extract_images.cache_grafos import (
+    CONCURRENCIA_OVERPASS,
+    DIRECTORIO_CACHE,
+    REFRESCAR,
+    archivo_cache,
+    red_vial_cacheada,
+)
+
+load_dotenv()
+
+# Overpass responde bien hasta unos 50 km² por consulta (ver
+# verificar_tamaño_bbox.py); más arriba la caja se parte en cuatro.
+AREA_MAXIMA_KM2 = float(os.getenv("AREA_MAXIMA_KM2", "50"))
+PROFUNDIDAD_MAXIMA = 6
+
+_LOCK = threading.Lock()
+_RESULTADOS = {}
+_EN_VUELO = {}
+
+
+def area_km2(bbox):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat_centro = (lat_min + lat_max) / 2
+    alto = abs(lat_max - lat_min) * 111
+    ancho = abs(lon_max - lon_min) * 111 * math.cos(math.radians(lat_centro))
+    return alto * ancho
+
+
+def teselar(bbox, area_maxima=AREA_MAXIMA_KM2, profundidad=0):
+    # Quadtree: solo se parten las cajas que siguen siendo grandes
+    if area_km2(bbox) <= area_maxima or profundidad >= PROFUNDIDAD_MAXIMA:
+        return [bbox]
+
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat_medio = (lat_min + lat_max) / 2
+    lon_medio = (lon_min + lon_max) / 2
+    teselas = []
+    for lats in ((lat_min, lat_medio), (lat_medio, lat_max)):
+        for lons in ((lon_min, lon_medio), (lon_medio, lon_max)):
+            teselas.extend(teselar(lats + lons, area_maxima, profundidad + 1))
+    return teselas
+
+
+def unir_nodos(partes):
+    # Los nodos del borde entre dos teselas llegan en ambas: los de OSM se
+    # deduplican por id y los puntos sobre aristas (id -1) por coordenada.
+    partes = [p for p in partes if p is not None and len(p)]
+    if not partes:
+        return None
+
+    nodos = np.concatenate(partes)
+    de_osm = nodos["id"] >= 0
+
+    _, unicos = np.unique(nodos["id"][de_osm], return_index=True)
+    interpolados = nodos[~de_osm]
+    coordenadas = np.round(
+        np.stack([interpolados["lat"], interpolados["lon"]], axis=1), 7
+    )
+    _, unicos_interpolados = np.unique(coordenadas, axis=0, return_index=True)
+
+    return np.concatenate(
+        [nodos[de_osm][np.sort(unicos)], interpolados[np.sort(unicos_interpolados)]]
+    )
+
+
+def descargador_bbox(network_type):
+    # Convención de osmnx 2: bbox = (oeste, sur, este, norte)
+    import osmnx as ox
+
+    def descargar(caja):
+        lat_min, lat_max, lon_min, lon_max = caja
+        return ox.graph_from_bbox(
+            (lon_min, lat_min, lon_max, lat_max), network_type=network_type
+        )
+
+    return descargar
+
+
+def descargador_poligono(network_type):
+    # Para lugares chicos: el polígono ya geocodificado se usa directo, sin
+    # que graph_from_place vuelva a consultar Nominatim.
+    import osmnx as ox
+
+    def descargar(poligono):
+        return ox.graph_from_polygon(poligono, network_type=network_type)
+
+    return descargar
+
+
+def _una_sola_vez(clave, calcular):
+    # Como red_vial_cacheada: pedidos simultáneos de la misma clave esperan
+    # a un solo cálculo, que corre sin el lock (geocodificar o descargar
+    # tarda) para no frenar a las demás claves.
+    with _LOCK:
+        if clave in _RESULTADOS:
+            return _RESULTADOS[clave]
+        futuro = _EN_VUELO.get(clave)
+        propio = futuro is None
+        if propio:
+            futuro = _EN_VUELO[clave] = Future()
+
+    if not propio:
+        return futuro.result()
+
+    resultado = None
+    try:
+        resultado = calcular()
+    except Exception as e:
+        futuro.set_exception(e)
+        raise
+    else:
+        futuro.set_result(resultado)
+    finally:
+        with _LOCK:
+            del _EN_VUELO[clave]
+            # Un fallo no se recuerda: el próximo pedido vuelve a intentar
+            if resultado is not None:
+                _RESULTADOS[clave] = resultado
+    return resultado
+
+
+def red_vial_teselada(bbox, network_type, descargar_tesela, area_maxima=AREA_MAXIMA_KM2):
+    # descargar_tesela(caja) devuelve el grafo de una tesela; cada tesela se
+    # cachea por separado y se piden en paralelo (el semáforo de Overpass en
+    # cache_grafos pone el techo real).
+    teselas = teselar(bbox, area_maxima)
+    if len(teselas) == 1:
+        return red_vial_cacheada(bbox, network_type, lambda: descargar_tesela(bbox))
+
+    print(
+        f"   🧩 Caja de {area_km2(bbox):.0f} km² → {len(teselas)} teselas "
+        f"de hasta {area_maxima:.0f} km²"
+    )
+
+    def descargar(caja):
+        try:
+            return red_vial_cacheada(caja, network_type, lambda: descargar_tesela(caja))
+        except Exception as e:
+            print(f"      ⚠️  Error descargando tesela {caja}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCIA_OVERPASS) as executor:
+        partes = list(executor.map(descargar, teselas))
+
+    faltantes = sum(p is None for p in partes)
+    if faltantes:
+        print(f"      ⚠️  {faltantes}/{len(teselas)} teselas sin red vial")
+    return unir_nodos(partes)
+
+
+def red_vial_lugar_teselada(
+    lugar, network_type, descargar_lugar, descargar_tesela, area_maxima=AREA_MAXIMA_KM2
+):
+    # Lugares grandes: se teselan los límites del polígono y se descartan los
+    # nodos que caen fuera de él. descargar_lugar(poligono) baja los chicos
+    # de una vez (ver descargador_poligono).
+    return _una_sola_vez(
+        ("red", lugar, network_type, area_maxima),
+        lambda: _red_vial_lugar(
+            lugar, network_type, descargar_lugar, descargar_tesela, area_maxima
+        ),
+    )
+
+
+def _red_vial_lugar(lugar, network_type, descargar_lugar, descargar_tesela, area_maxima):
+    import shapely
+
+    poligono = poligono_de_lugar(lugar)
+    if poligono is None:
+        print(f"   ⚠️  No se encontró el polígono de {lugar}")
+        return None
+    lon_min, lat_min, lon_max, lat_max = poligono.bounds
+    bbox = (lat_min, lat_max, lon_min, lon_max)
+
+    if area_km2(bbox) <= area_maxima:
+        return red_vial_cacheada(lugar, network_type, lambda: descargar_lugar(poligono))
+
+    nodos = red_vial_teselada(bbox, network_type, descargar_tesela, area_maxima)
+    if nodos is None:
+        return None
+    return nodos[shapely.contains_xy(poligono, nodos["lon"], nodos["lat"])]
+
+
+def poligono_de_lugar(lugar, directorio=DIRECTORIO_CACHE):
+    # El polígono geocodificado se guarda junto a las redes: con cache, una
+    # corrida no vuelve a consultar Nominatim, y lugares repetidos en la
+    # misma corrida se geocodifican una sola vez. Con ARCHIVO_PBF sale de los
+    # límites del extracto, sin Nominatim.
+    from src.extract_images import extracto_osm
+
+    if extracto_osm.ARCHIVO_PBF:
+        return extracto_osm.poligono_de_lugar(lugar)
+
+    return _una_sola_vez(
+        ("poligono", lugar), lambda: _geocodificar(lugar, directorio)
+    )
+
+
+def _geocodificar(lugar, directorio):
+    import shapely
+
+    archivo = archivo_cache(lugar, "poligono", directorio).with_suffix(".wkb")
+    if archivo.exists() and not REFRESCAR:
+        return shapely.from_wkb(archivo.read_bytes())
+
+    import osmnx as ox
+
+    poligono = ox.geocode_to_gdf(lugar).geometry.iloc[0]
+    try:
+        archivo.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=archivo.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(shapely.to_wkb(poligono))
+        os.replace(tmp, archivo)
+    except OSError as e:
+        print(f"   ⚠️  No se pudo guardar el polígono de {lugar}: {e}")
+    return poligono
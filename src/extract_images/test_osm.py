@@ -1,8 +1,11 @@
 import osmnx as ox
-import requests
 import random
 from pathlib import Path
 from datetime import datetime
+from src.extract_images.cliente_street_view import (
+    descargar_imagen,
+    verificar_street_view,
+)
 
 API_KEY = ""
 
@@ -55,47 +58,6 @@ def seleccionar_puntos_aleatorios(graph, n_puntos):
     return puntos
 
 
-def verificar_street_view(lat, lon, api_key):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview/metadata?"
-        f"location={lat},{lon}&key={api_key}"
-    )
-
-    try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-
-        return data.get("status") == "OK"
-    except:
-        return False
-
-
-def descargar_imagen(lat, lon, api_key, filename):
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview?"
-        f"size=640x640&"
-        f"location={lat},{lon}&"
-        f"fov=90&"
-        f"pitch=0&"
-        f"heading=0&"
-        f"key={api_key}"
-    )
-
-    try:
-        response = requests.get(url, timeout=15)
-
-        if response.status_code == 200:
-            with open(filename, "wb") as f:
-                f.write(response.content)
-            return True
-        else:
-            return False
-
-    except Exception as e:
-        print(f"      Error: {e}")
-        return False
-
-
 def main():
     print("\n" + "=" * 70)
     print("🌎 DESCARGADOR DE IMÁGENES CON OPENSTREETMAP")
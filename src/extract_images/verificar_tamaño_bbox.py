@@ -1,4 +1,5 @@
 import math
+from src.extract_images.teselado import AREA_MAXIMA_KM2, teselar
 
 URBANIZACIONES = {
     "Arequipa - Alto - Cayma Norte": (-16.393344, -16.278875, -71.556694, -71.447529),
@@ -50,12 +51,13 @@ def main():
 
     resultados.sort(key=lambda x: x[1], reverse=True)
 
-    print(f"{'Urbanización':<50} {'Área (km²)':<15}")
+    print(f"{'Urbanización':<50} {'Área (km²)':<15} {'Teselas':<8}")
     print("=" * 80)
 
     for nombre, area, bbox in resultados:
         nivel = "🔴 MUY GRANDE" if area > 200 else "🟡 GRANDE" if area > 50 else "🟢 OK"
-        print(f"{nombre:<50} {area:>10.2f} km²    {nivel}")
+        teselas = len(teselar(bbox))
+        print(f"{nombre:<50} {area:>10.2f} km²  {teselas:>4}    {nivel}")
 
     print("\n" + "=" * 80)
     print("📊 RESUMEN")
@@ -69,9 +71,9 @@ def main():
     print(f"🟡 GRANDES (50-200 km²): {grandes}")
     print(f"🟢 OK (<50 km²): {ok}")
 
-    print("\n💡 RECOMENDACIÓN:")
-    print("   Los bounding boxes MUY GRANDES tardarán mucho en descargar.")
-    print("   Se recomienda subdividirlos en áreas más pequeñas (<50 km²).")
+    total_teselas = sum(len(teselar(bbox)) for _, _, bbox in resultados)
+    print(f"\n🧩 Teselas a descargar (hasta {AREA_MAXIMA_KM2:.0f} km²): {total_teselas}")
+    print("   Las cajas grandes se parten solas al descargar (ver teselado.py).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+import torch
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+from tqdm import tqdm
+from itertools import islice
+import io
+import time
+
+# Transform
+transform = transforms.Compose(
+    [
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ]
+)
+
+
+def load_images_from_shards(shard_dir, shuffle_buffer=0, worker_id=0, num_workers=1):
+    """Alternativa a load_images_from_folders: lee las muestras en streaming desde shards .tar
+
+    Devuelve un iterador con los bytes de cada imagen, el total de muestras según el
+    índice y un dict de listas (image_path, label, category, lat, lon) que se llena a
+    medida que extract_features consume el iterador."""
+    from src.extract_images.salida_imagenes import (
+        asignar_shards,
+        iterar_shards,
+        leer_indice,
+    )
+
+    # Mismas categorías y orden que load_images_from_folders
+    category_names = ["Alto", "Medio", "Bajo"]
+
+    shards = asignar_shards(shard_dir, worker_id, num_workers)
+    n = sum(
+        1
+        for entrada in leer_indice(shard_dir, shards)
+        if entrada["clave"].split("/")[0] in category_names
+    )
+
+    print(f"\n📦 Shards asignados (worker {worker_id}/{num_workers}): {len(shards)}")
+    print(f"✅ Total: {n} imágenes")
+
+    meta = {"image_path": [], "label": [], "category": [], "lat": [], "lon": []}
+
+    def stream():
+        for muestra in iterar_shards(shard_dir, shards, buffer_barajado=shuffle_buffer):
+            cat_name = muestra["clave"].split("/")[0]
+            if cat_name not in category_names:
+                continue
+
+            meta["image_path"].append(muestra["clave"])
+            meta["label"].append(category_names.index(cat_name))
+            meta["category"].append(cat_name)
+            meta["lat"].append(muestra["metadata"].get("lat"))
+            meta["lon"].append(muestra["metadata"].get("lon"))
+            yield muestra["imagen"]
+
+    return stream(), n, meta
+
+
+def open_image(source):
+    """Abre una imagen desde una ruta o desde sus bytes"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return Image.open(source).convert("RGB")
+
+
+def extract_features(model, image_paths, batch_size=16, n=None, device="cpu"):
+    """Extrae features con contador detallado (rutas, bytes o un iterador con n)
+
+    n es solo el total esperado: con shards puede diferir de lo que el iterador
+    entrega, así que la matriz se recorta a las imágenes realmente procesadas."""
+    if n is None:
+        n = len(image_paths)
+    sources = iter(image_paths)
+    features = None
+    processed = 0
+
+    start_time = time.time()
+    errors = 0
+
+    # Barra de progreso con detalles
+    pbar = tqdm(
+        total=n,
+        desc="Extrayendo features",
+        unit="img",
+        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
+    )
+
+    with torch.no_grad():
+        while True:
+            batch_paths = list(islice(sources, batch_size))
+            if not batch_paths:
+                break
+            batch = []
+
+            for path in batch_paths:
+                try:
+                    img = open_image(path)
+                    batch.append(transform(img))
+                except Exception as e:
+                    errors += 1
+                    batch.append(torch.zeros(3, 224, 224))
+
+            batch_tensor = torch.stack(batch).to(device)
+            feat = model(batch_tensor).cpu().numpy()
+
+            if features is None:
+                features = np.zeros((max(n, len(feat)), feat.shape[1]), dtype=np.float32)
+            elif processed + len(feat) > len(features):
+                # El iterador entregó más de lo que decía el índice
+                extra = np.zeros((len(feat), features.shape[1]), dtype=np.float32)
+                features = np.concatenate([features, extra])
+            features[processed : processed + len(feat)] = feat
+            processed += len(feat)
+
+            # Actualizar progreso
+            pbar.update(len(batch))
+
+            # Calcular estadísticas cada 100 imágenes
+            if processed % 100 < batch_size or processed >= n:
+                elapsed = time.time() - start_time
+                imgs_per_sec = processed / elapsed
+                remaining_imgs = max(n - processed, 0)
+                eta_seconds = remaining_imgs / imgs_per_sec if imgs_per_sec > 0 else 0
+
+                # Actualizar descripción
+                pbar.set_postfix(
+                    {
+                        "img/s": f"{imgs_per_sec:.1f}",
+                        "ETA": f"{eta_seconds/60:.1f}min",
+                        "errors": errors,
+                    }
+                )
+
+    pbar.close()
+
+    if features is None:
+        features = np.zeros((0, 0), dtype=np.float32)
+
+    # Resumen final
+    total_time = time.time() - start_time
+    print(f"\n{'='*60}")
+    print(f"✅ Extracción completada!")
+    print(f"   Tiempo total: {total_time/60:.1f} minutos ({total_time:.1f} segundos)")
+    print(f"   Imágenes procesadas: {processed}")
+    if processed != n:
+        print(f"   ⚠️  Se esperaban {n} según el índice")
+    print(f"   Velocidad promedio: {processed/max(total_time, 1e-9):.2f} img/s")
+    print(f"   Errores: {errors}")
+    print(f"{'='*60}\n")
+
+    return features[:processed]
@@ -1,12 +1,15 @@
 import torch
 import numpy as np
 import pandas as pd
-from PIL import Image
-from torchvision import transforms
 from pathlib import Path
-from tqdm import tqdm
 import os
-import time
+
+# Se puede correr desde la raíz del repo (python -m src.generate_feature_vector_gpu)
+# o desde src/, como espera base_path
+try:
+    from src.feature_extraction import extract_features, load_images_from_shards
+except ModuleNotFoundError:
+    from feature_extraction import extract_features, load_images_from_shards
 
 # Optimización CPU
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -18,16 +21,6 @@ model = torch.hub.load("facebookresearch/dinov2", "dinov2_vitg14")
 model = model.to(device)
 model.eval()
 
-# Transform
-transform = transforms.Compose(
-    [
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ]
-)
-
 
 def load_images_from_folders(base_path):
     """Carga rutas desde carpetas de categorías Alto, Medio y Bajo"""
@@ -60,75 +53,6 @@ def load_images_from_folders(base_path):
     return image_paths, labels, categories
 
 
-def extract_features(image_paths, batch_size=16):
-    """Extrae features con contador detallado"""
-    n = len(image_paths)
-    features = np.zeros((n, 1536), dtype=np.float32)
-
-    start_time = time.time()
-    errors = 0
-
-    # Barra de progreso con detalles
-    pbar = tqdm(
-        total=n,
-        desc="Extrayendo features",
-        unit="img",
-        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
-    )
-
-    with torch.no_grad():
-        for i in range(0, n, batch_size):
-            batch_start = time.time()
-            batch_paths = image_paths[i : i + batch_size]
-            batch = []
-
-            for path in batch_paths:
-                try:
-                    img = Image.open(path).convert("RGB")
-                    batch.append(transform(img))
-                except Exception as e:
-                    errors += 1
-                    batch.append(torch.zeros(3, 224, 224))
-
-            batch_tensor = torch.stack(batch).to(device)
-            feat = model(batch_tensor).cpu().numpy()
-            features[i : i + len(batch)] = feat
-
-            # Actualizar progreso
-            pbar.update(len(batch))
-
-            # Calcular estadísticas cada 100 imágenes
-            if (i + batch_size) % 100 == 0 or (i + batch_size) >= n:
-                elapsed = time.time() - start_time
-                processed = min(i + batch_size, n)
-                imgs_per_sec = processed / elapsed
-                remaining_imgs = n - processed
-                eta_seconds = remaining_imgs / imgs_per_sec if imgs_per_sec > 0 else 0
-
-                # Actualizar descripción
-                pbar.set_postfix(
-                    {
-                        "img/s": f"{imgs_per_sec:.1f}",
-                        "ETA": f"{eta_seconds/60:.1f}min",
-                        "errors": errors,
-                    }
-                )
-
-    pbar.close()
-
-    # Resumen final
-    total_time = time.time() - start_time
-    print(f"\n{'='*60}")
-    print(f"✅ Extracción completada!")
-    print(f"   Tiempo total: {total_time/60:.1f} minutos ({total_time:.1f} segundos)")
-    print(f"   Imágenes procesadas: {n}")
-    print(f"   Velocidad promedio: {n/total_time:.2f} img/s")
-    print(f"   Errores: {errors}")
-    print(f"{'='*60}\n")
-
-    return features
-
-
 # ============ EJECUTAR ============
 
 if __name__ == "__main__":
@@ -136,33 +60,47 @@ if __name__ == "__main__":
     print("🏙️  EXTRACCIÓN DE FEATURES - NIVEL SOCIOECONÓMICO")
     print(f"{'='*60}\n")
 
-    # Cargar datos desde final_images (Alto, Medio, Bajo)
-    base_path = "./images"
-    image_paths, labels, categories = load_images_from_folders(base_path)
+    # Con SHARDS_DIR se leen los shards .tar en streaming en vez de las carpetas
+    shard_dir = os.getenv("SHARDS_DIR")
+    worker_id = int(os.getenv("SHARD_WORKER", "0"))
+    num_workers = int(os.getenv("SHARD_WORKERS", "1"))
+
+    if shard_dir:
+        images, n, meta = load_images_from_shards(
+            shard_dir, worker_id=worker_id, num_workers=num_workers
+        )
+    else:
+        # Cargar datos desde final_images (Alto, Medio, Bajo)
+        base_path = "./images"
+        image_paths, labels, categories = load_images_from_folders(base_path)
+        images, n = image_paths, len(image_paths)
+        meta = {"image_path": image_paths, "label": labels, "category": categories}
 
     # Estimación de tiempo
-    estimated_time = len(image_paths) * 0.5 / 60
+    estimated_time = n * 0.5 / 60
     print(f"\n⏱️  Tiempo estimado: ~{estimated_time:.1f} minutos")
     print(f"⏳ Iniciando extracción...\n")
 
     # Extraer features
-    X = extract_features(image_paths, batch_size=16)
+    X = extract_features(model, images, batch_size=16, n=n, device=device)
+
+    # Crear DataFrame (con shards, meta se completa durante la extracción y
+    # tiene tantas filas como imágenes entregó el iterador, igual que X)
+    df = pd.DataFrame(meta)
 
-    # Crear DataFrame
-    df = pd.DataFrame(
-        {"image_path": image_paths, "label": labels, "category": categories}
-    )
+    # Un par de archivos por worker cuando la extracción se reparte
+    suffix = f"_{worker_id}" if num_workers > 1 else ""
 
     # Guardar
     print("💾 Guardando archivos...")
-    np.save("X_features.npy", X)
-    df.to_csv("y_labels.csv", index=False)
+    np.save(f"X_features{suffix}.npy", X)
+    df.to_csv(f"y_labels{suffix}.csv", index=False)
 
     print(f"\n{'='*60}")
     print("📊 ARCHIVOS GENERADOS:")
     print(f"{'='*60}")
-    print(f"   ✓ X_features.npy - Shape: {X.shape}")
-    print(f"   ✓ y_labels.csv - {len(df)} registros")
+    print(f"   ✓ X_features{suffix}.npy - Shape: {X.shape}")
+    print(f"   ✓ y_labels{suffix}.csv - {len(df)} registros")
     print(f"\n📈 Distribución de categorías:")
     print(df["category"].value_counts().to_string())
     print(f"{'='*60}\n")